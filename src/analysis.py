@@ -1,6 +1,9 @@
 import pandas as pd
 import numpy as np
+from profiler import traced
+from laptrace import channel, lapSeconds
 
+@traced()
 def computeDeltaTime(driver1Tel, driver2Tel):
     """
     Computes the time difference between two drivers over the course of a lap.
@@ -8,8 +11,8 @@ def computeDeltaTime(driver1Tel, driver2Tel):
     
     Positive delta means Driver 1 is faster (Driver 2 took more time to reach the same point).
     Negative delta means Driver 2 is faster.
-    :param driver1Tel (dataframe): Driver 1's telemetry data
-    :param driver2Tel (dataframe): Driver 2's telemetry data
+    :param driver1Tel (dataframe or LapTrace): Driver 1's telemetry data
+    :param driver2Tel (dataframe or LapTrace): Driver 2's telemetry data
     """
     #let's create a common distance axis (0 to the end of the lap)
     #then we take the shorter total distance to avoid extrapolation errors
@@ -19,8 +22,8 @@ def computeDeltaTime(driver1Tel, driver2Tel):
 
     #in order for this to work correctly, we need to convert Time to seconds
     #also we need strictly increasing time
-    d1TimeSeconds = driver1Tel['Time'].dt.total_seconds()
-    d2TimeSeconds = driver2Tel['Time'].dt.total_seconds()
+    d1TimeSeconds = lapSeconds(driver1Tel)
+    d2TimeSeconds = lapSeconds(driver2Tel)
 
     #now we interpolate time
     #basically 'at distance x, what was the time for driver 1?'
@@ -34,4 +37,75 @@ def computeDeltaTime(driver1Tel, driver2Tel):
     return pd.DataFrame({
         'Distance': sectionDist,
         'Delta': deltaSeconds
-    })
\ No newline at end of file
+    })
+
+def _interpStacked(grid, distances, times):
+    """
+    Interpolates every driver on the same grid in a single np.interp call.
+    Each driver's samples are shifted onto their own distance band so one
+    sorted array holds all of them, then the grid is repeated on each band.
+    Works the same for any increasing x (e.g. session time instead of distance).
+    """
+    lo = min(grid[0], min(d[0] for d in distances))
+    span = max(grid[-1], max(d[-1] for d in distances)) - lo + 1.0
+    xp, fp, x = [], [], []
+    for i, (dist, t) in enumerate(zip(distances, times)):
+        offset = i * 4 * span - lo
+        #sentinels before the first and after the last sample clamp like np.interp does, instead of
+        #interpolating from the previous driver's last sample or towards the next driver's first
+        xp.append(np.concatenate(([offset + lo - span], dist + offset, [offset + lo + 2 * span])))
+        fp.append(np.concatenate(([t[0]], t, [t[-1]])))
+        x.append(grid + offset)
+    return np.interp(np.concatenate(x), np.concatenate(xp), np.concatenate(fp)).reshape(len(distances), len(grid))
+
+def computeTimeGrid(telemetries, step=1.0):
+    """
+    Puts N drivers on one shared distance grid.
+    Returns the grid and a (drivers x distance) float32 array of lap time in seconds.
+
+    :param telemetries (list): the drivers' telemetry dataframes or LapTraces
+    :param step (float): grid spacing in meters
+    """
+    distances = [channel(tel, 'Distance') for tel in telemetries]
+    times = [lapSeconds(tel) for tel in telemetries]
+    #same as computeDeltaTime, we stop at the shortest lap to avoid extrapolation
+    maxDist = min(d.max() for d in distances)
+    sectionDist = np.linspace(0, maxDist, num=max(2, int(maxDist / step)))
+    timeGrid = _interpStacked(sectionDist, distances, times).astype(np.float32)
+    return sectionDist.astype(np.float32), timeGrid
+
+@traced()
+def computeDeltaMatrix(telemetries, step=1.0):
+    """
+    Computes the gap between every pair of drivers at once.
+    Returns the distance grid, the (drivers x distance) time array and a
+    (drivers x drivers x distance) delta array, all float32.
+
+    deltas[i, j] is the same as computeDeltaTime(telemetries[i], telemetries[j]):
+    positive means driver i is faster at that point.
+    :param telemetries (list): the drivers' telemetry dataframes or LapTraces
+    :param step (float): grid spacing in meters
+    """
+    sectionDist, timeGrid = computeTimeGrid(telemetries, step)
+    #broadcasting gives every (i, j) pair in one subtraction
+    deltas = timeGrid[np.newaxis, :, :] - timeGrid[:, np.newaxis, :]
+    return sectionDist, timeGrid, deltas
+
+@traced()
+def computeMinisectors(telemetries, nSectors=50):
+    """
+    Splits the lap into equal-distance minisectors and times every driver through each of them.
+    Returns the sector boundaries (nSectors + 1 distances), a (drivers x nSectors) float32
+    array of sector times in seconds and the index of the fastest driver in each sector.
+
+    :param telemetries (list): the drivers' telemetry dataframes or LapTraces
+    :param nSectors (int): number of minisectors
+    """
+    distances = [channel(tel, 'Distance') for tel in telemetries]
+    times = [lapSeconds(tel) for tel in telemetries]
+    maxDist = min(d.max() for d in distances)
+    boundaries = np.linspace(0, maxDist, nSectors + 1)
+    #time at every boundary for every driver, then the sector time is just the difference
+    boundaryTimes = _interpStacked(boundaries, distances, times)
+    sectorTimes = np.diff(boundaryTimes, axis=1).astype(np.float32)
+    return boundaries, sectorTimes, np.argmin(sectorTimes, axis=0)
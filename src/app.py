@@ -1,12 +1,35 @@
+import json
+import uuid
 import streamlit as st
-import fastf1
-import fastf1.plotting
-from telemetry import loadSession, loadSessionLight, getFastestLap
-from analysis import computeDeltaTime
+import pandas as pd
+# FastF1 and pyarrow are imported where they are needed, the first render doesn't wait for them
+from telemetry import initCache, getPooledSession, getFastestTrace, sessionPool
 from plotter import plotAnalysis
-from track import plotTrackMap
+from track import plotTrackMap, plotDominanceMap
+from corners import analyzeCorners
+from degradation import fitDegradation
+from profiler import Profiler
+from metadata import listYears, listEvents, listEntries
+from resultcache import resultCache, cachedDeltaMatrix, cachedFigure, analysisParams
+from centerline import getCenterline, alignTrace
+from channels import DERIVED_CHANNELS, rawRequirements
+from laptrace import TRACE_CHANNELS
+from prefetch import prefetcher
+
+# the only telemetry channels the dashboard plots
+TELEMETRY_CHANNELS = ["Speed", "Throttle", "Brake", "nGear", "X", "Y"]
+# points per trace in fast rendering, about the pixel width of the chart
+RENDER_MAX_POINTS = 1500
+# derived channels the plotted laps have the inputs for (DRS isn't kept in a LapTrace)
+EXTRA_CHANNELS = [
+    name for name in DERIVED_CHANNELS
+    if all(c in TRACE_CHANNELS for c in rawRequirements([name]))
+]
 
 st.set_page_config(page_title="F1 Telemetry Analytics", layout="wide")
+# identifies this browser session to the prefetcher, a new selection replaces only our own prefetch
+if "client_id" not in st.session_state:
+    st.session_state["client_id"] = uuid.uuid4().hex
 
 st.title("F1 Telemetry Analytics")
 st.markdown(
@@ -16,10 +39,15 @@ st.markdown(
 # sidebar configuration
 with st.sidebar:
     st.header("Session Configuration")
-    year = st.selectbox("Season", range(2025, 2018, -1))
+    # the local index (metadata.py) answers in milliseconds, the API is the fallback
+    year = st.selectbox("Season", listYears() or range(2025, 2018, -1))
     # schedule loader
     try:
-        schedule = fastf1.get_event_schedule(year, include_testing=False)
+        schedule = listEvents(year)
+        if schedule.empty:
+            import fastf1
+            initCache()
+            schedule = fastf1.get_event_schedule(year, include_testing=False)
         gp_list = schedule["EventName"].tolist()
         gp = st.selectbox("Grand Prix", gp_list)
     except:
@@ -31,25 +59,21 @@ with st.sidebar:
     # we cache this because loading the driver list takes a few seconds
     @st.cache_data
     def get_drivers(y, g, s):
-        session = loadSessionLight(y, g, s)
+        session = getPooledSession(y, g, s, light=True)
         if session:
-            return session.drivers  # the ids
+            # let's sort drivers by team or abbreviation
+            return sorted(session.results["Abbreviation"].dropna().unique().tolist())
         return []
 
     # we get the driver Codes from the session
     # we need to load the light session first to know who drove
-    with st.spinner(f"Loading Driver List for {gp}..."):
-        session_light = loadSessionLight(year, gp, sessionType)
-
-    driver_options = []
-    if session_light:
-        # let's sort drivers by team or abbreviation
-        try:
-            driver_options = sorted(
-                session_light.results["Abbreviation"].dropna().unique().tolist()
-            )
-        except:
-            driver_options = ["VER", "LEC", "HAM", "NOR", "PIA", "RUS", "ALO"]
+    driver_options = sorted(listEntries(year, gp, sessionType)["Abbreviation"].dropna().unique().tolist())
+    if not driver_options:
+        with st.spinner(f"Loading Driver List for {gp}..."):
+            try:
+                driver_options = get_drivers(year, gp, sessionType)
+            except:
+                driver_options = ["VER", "LEC", "HAM", "NOR", "PIA", "RUS", "ALO"]
     st.divider()
     selected_drivers = st.multiselect(
         "Select Drivers (Max 5)",
@@ -63,91 +87,245 @@ with st.sidebar:
         )
     else:
         ref_driver = None
+    # WebGL + downsampled traces keep the page responsive with 5 drivers
+    fast_render = st.checkbox("Fast rendering (WebGL)", value=True)
+    n_minisectors = st.slider("Minisectors", min_value=10, max_value=300, value=100, step=10)
+    # measure every lap along the same reference line instead of its own integrated distance
+    align_laps = st.checkbox("Align laps on the racing line", value=False)
+    # extra panels under the gear, computed once per lap
+    extra_channels = st.multiselect("Extra channels", options=EXTRA_CHANNELS, default=[])
+    # stage timings in the status panel, off by default
+    profile_pipeline = st.checkbox("Profile pipeline", value=False)
     run_btn = st.button(
         "Analyze Telemetry", type="primary", disabled=not selected_drivers
     )
+    # start loading the selection while the user is still configuring,
+    # the Analyze step then picks up the loaded (or still loading) session
+    if selected_drivers and not run_btn:
+        prefetcher.request(
+            st.session_state["client_id"], year, gp, sessionType,
+            drivers=selected_drivers, channels=TELEMETRY_CHANNELS,
+        )
+    # shared session pool, same for every user of this server
+    pool_stats = sessionPool.stats()
+    st.caption(
+        f"Session pool: {pool_stats['sessions']} loaded "
+        f"({pool_stats['bytes'] / 1024**2:.0f} MB), "
+        f"{pool_stats['hits']} hits / {pool_stats['misses']} misses / "
+        f"{pool_stats['evictions']} evictions"
+    )
+    prefetch_stats = prefetcher.stats()
+    st.caption(
+        f"Prefetch: {prefetch_stats['pending']} pending, "
+        f"{prefetch_stats['finished']} done, "
+        f"{prefetch_stats['cancelled'] + prefetch_stats['superseded']} dropped"
+    )
+    cache_stats = resultCache.stats()
+    st.caption(
+        f"Result cache: {cache_stats['bytes'] / 1024**2:.0f} MB, "
+        f"{cache_stats['hitRate']:.0%} hit rate "
+        f"({cache_stats['hits']} hits / {cache_stats['misses']} misses)"
+    )
 
 # main logic
 if run_btn and selected_drivers:
-    drivers_data = {}  # to store telemetry: {'VER': {'tel': df, 'color': 'blue'}, ...}
+    drivers_data = {}  # to store telemetry: {'VER': {'tel': LapTrace, 'color': 'blue'}, ...}
     deltas = {}  # to store gaps: {'LEC': delta_df}
-    with st.status("⬇Processing Telemetry...", expanded=True) as status:
-        # loading full sessions
-        status.write(f"Downloading full telemetry for {year} {gp}...")
-        session = loadSession(year, gp, sessionType)
-        if not session:
-            st.error("Failed to load session.")
-            st.stop()
-        # loop through drivers
-        for driver in selected_drivers:
-            status.write(f"Processing {driver}...")
-            # get lap data
-            lap, tel = getFastestLap(session, driver)
-            if tel is not None:
-                # store data
-                team_color = fastf1.plotting.get_driver_color(driver, session=session)
-                drivers_data[driver] = {
-                    "tel": tel,
-                    "color": team_color,
-                    "lapTime": lap["LapTime"],
-                }
-            else:
-                st.warning(f"No telemetry found for {driver}")
-        # then we compute the deltas
-        if ref_driver in drivers_data:
-            ref_tel = drivers_data[ref_driver]["tel"]
+    profiler = Profiler().start() if profile_pipeline else None
+    try:
+        # deltas and figures are cached on disk under this key plus drivers and options
+        session_key = (year, gp, sessionType)
+        with st.status("⬇Processing Telemetry...", expanded=True) as status:
+            # team colours, the only thing the dashboard takes from FastF1 directly
+            import fastf1.plotting
+            # loading full sessions
+            status.write(f"Downloading telemetry for {year} {gp}...")
+            session = getPooledSession(
+                year, gp, sessionType, drivers=selected_drivers, channels=TELEMETRY_CHANNELS
+            )
+            # attached to the load, the prefetch entry of this browser session isn't needed anymore
+            prefetcher.forget(st.session_state["client_id"])
+            if not session:
+                st.error("Failed to load session.")
+                st.stop()
+            # one centerline per circuit, built once and reused by every session there
+            line = getCenterline(session) if align_laps else None
+            aligned = line is not None
+            if align_laps and not aligned:
+                st.warning("No position data to build the racing line, laps are not aligned.")
+            # loop through drivers
             for driver in selected_drivers:
-                if driver != ref_driver and driver in drivers_data:
-                    # calc delta, in a ref vs driver way (we want the gap to ref)
-                    # if computeDeltaTime(ref, driver) result is positive, it means that ref is ahead
-                    delta_df = computeDeltaTime(ref_tel, drivers_data[driver]["tel"])
-                    deltas[driver] = delta_df
-        status.update(label="Analysis Complete!", state="complete")
-    # to keep it clean we plot the reference driver
-    map_driver = ref_driver if ref_driver else selected_drivers[0]
-    if map_driver in drivers_data:
-        st.subheader(f"Track Dominance Map ({map_driver})")
-        with st.spinner("Generating Heatmap..."):
-            map_fig = plotTrackMap(session, map_driver, drivers_data[map_driver]["tel"])
-            st.plotly_chart(map_fig, use_container_width=True)
-    st.divider()
-    st.subheader(f"Lap Comparison (Reference: {ref_driver})")
-    # lap time metrics
-    cols = st.columns(len(selected_drivers))
-    for i, driver in enumerate(selected_drivers):
-        if driver in drivers_data:
-            lap_time = (
-                str(drivers_data[driver]["lapTime"]).split("days")[-1].strip()[:-3]
-            )  # to truncate the microseconds
-            # the color choice
-            if driver == ref_driver:
-                cols[i].metric(
-                    label=driver, value=lap_time, delta="Ref", delta_color="off"
+                status.write(f"Processing {driver}...")
+                # get lap data, already extracted if the prefetch got there first
+                # only the channels we plot, as compact arrays, the full frame is dropped
+                lap, tel = getFastestTrace(session, driver)
+                if tel is not None:
+                    # store data
+                    team_color = fastf1.plotting.get_driver_color(driver, session=session)
+                    drivers_data[driver] = {
+                        "tel": alignTrace(tel, line) if aligned else tel,
+                        "color": team_color,
+                        "lapTime": lap["LapTime"],
+                    }
+                else:
+                    st.warning(f"No telemetry found for {driver}")
+            # then we compute the deltas
+            # all drivers go on one shared distance grid, the ref row of the matrix is the gap to ref
+            if ref_driver in drivers_data:
+                loaded = [d for d in selected_drivers if d in drivers_data]
+                distance, _, delta_matrix = cachedDeltaMatrix(
+                    session_key, loaded, [drivers_data[d]["tel"] for d in loaded], aligned=aligned
                 )
-            else:
-                # now let's compute the gap in final lap time
-                gap = (
-                    drivers_data[driver]["lapTime"]
-                    - drivers_data[ref_driver]["lapTime"]
-                ).total_seconds()
-                cols[i].metric(
-                    label=driver,
-                    value=lap_time,
-                    delta=f"{gap:+.3f}s",
-                    delta_color="inverse",
+                ref_idx = loaded.index(ref_driver)
+                for i, driver in enumerate(loaded):
+                    if driver != ref_driver:
+                        # if the result is positive, it means that ref is ahead
+                        deltas[driver] = pd.DataFrame(
+                            {"Distance": distance, "Delta": delta_matrix[ref_idx, i]}
+                        )
+            status.update(label="Analysis Complete!", state="complete")
+        # with several drivers we colour the track by who was fastest in each minisector
+        # the reference driver goes first, its racing line is the one we draw
+        map_drivers = sorted(drivers_data, key=lambda d: d != ref_driver)
+        colors = {d: drivers_data[d]["color"] for d in drivers_data}
+        if len(map_drivers) > 1:
+            st.subheader("Track Dominance Map")
+            with st.spinner("Generating Dominance Map..."):
+                map_fig, _ = cachedFigure(
+                    "dominanceMap",
+                    session_key,
+                    map_drivers,
+                    ref_driver,
+                    {"nSectors": n_minisectors, "colors": colors, "aligned": aligned},
+                    plotDominanceMap,
+                    session,
+                    map_drivers,
+                    [drivers_data[d]["tel"] for d in map_drivers],
+                    colors,
+                    n_minisectors,
                 )
+                st.plotly_chart(map_fig, use_container_width=True)
+        elif map_drivers:
+            # to keep it clean we plot the reference driver
+            map_driver = map_drivers[0]
+            st.subheader(f"Track Speed Map ({map_driver})")
+            with st.spinner("Generating Heatmap..."):
+                map_fig, _ = cachedFigure(
+                    "trackMap",
+                    session_key,
+                    map_drivers,
+                    ref_driver,
+                    {"aligned": aligned},
+                    plotTrackMap,
+                    session,
+                    map_driver,
+                    drivers_data[map_driver]["tel"],
+                )
+                st.plotly_chart(map_fig, use_container_width=True)
+        st.divider()
+        st.subheader(f"Lap Comparison (Reference: {ref_driver})")
+        # lap time metrics
+        cols = st.columns(len(selected_drivers))
+        for i, driver in enumerate(selected_drivers):
+            if driver in drivers_data:
+                lap_time = (
+                    str(drivers_data[driver]["lapTime"]).split("days")[-1].strip()[:-3]
+                )  # to truncate the microseconds
+                # the color choice
+                if driver == ref_driver:
+                    cols[i].metric(
+                        label=driver, value=lap_time, delta="Ref", delta_color="off"
+                    )
+                else:
+                    # now let's compute the gap in final lap time
+                    gap = (
+                        drivers_data[driver]["lapTime"]
+                        - drivers_data[ref_driver]["lapTime"]
+                    ).total_seconds()
+                    cols[i].metric(
+                        label=driver,
+                        value=lap_time,
+                        delta=f"{gap:+.3f}s",
+                        delta_color="inverse",
+                    )
+
+        with st.expander("Corner Analysis (all laps)"):
+            st.write("Braking point, apex and throttle pickup for every corner of every lap.")
+            try:
+                corner_df = analyzeCorners(session, list(drivers_data), aligned=aligned)
+                st.dataframe(corner_df, use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.warning(f"Corner analysis unavailable: {e}")
 
-    # plots
-    with st.expander("Export Data"):
-        st.write("Download the calculated delta data for external analysis.")
-        # let's combine the data into a nice CSV format
-        for driver, df in deltas.items():
-            csv = df.to_csv(index=False).encode("utf-8")
+        with st.expander("Tyre Degradation (long runs)"):
+            st.write(
+                "Fuel-corrected degradation per stint, in/out and safety car laps excluded."
+            )
+            try:
+                deg_df = fitDegradation(session.laps).reset_index()
+                st.dataframe(deg_df, use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.warning(f"Degradation model unavailable: {e}")
+
+        # plots
+        with st.expander("Export Data"):
+            st.write(
+                "Download the telemetry of every selected driver, the gaps between every pair "
+                "and the session metadata in one Parquet file (read it back with export.readExport)."
+            )
+            def build_export():
+                # pyarrow is only loaded by the first download
+                from export import exportAnalysisBytes
+                return exportAnalysisBytes(
+                    session, drivers_data, ref_driver,
+                    year=year, grandPrix=gp, sessionType=sessionType,
+                )
+            # the file is only built when the button is clicked, and the page doesn't rerun
             st.download_button(
-                label=f"Download {driver} vs {ref_driver} CSV",
-                data=csv,
-                file_name=f"delta_{driver}_vs_{ref_driver}.csv",
-                mime="text/csv",
+                label="Download Parquet export",
+                data=build_export,
+                file_name=f"f1_{year}_{gp}_{sessionType}.parquet".replace(" ", "_"),
+                mime="application/vnd.apache.parquet",
+                on_click="ignore",
+            )
+        fig, fig_stats = cachedFigure(
+            "analysis",
+            session_key,
+            list(drivers_data),
+            ref_driver,
+            analysisParams(
+                RENDER_MAX_POINTS if fast_render else None, fast_render, colors, aligned, extra_channels
+            ),
+            plotAnalysis,
+            session,
+            drivers_data,
+            deltas,
+            ref_driver,
+            maxPoints=RENDER_MAX_POINTS if fast_render else None,
+            webgl=fast_render,
+            channels=extra_channels,
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption(
+            f"Figure: {fig_stats['points']:,} points, "
+            f"{fig_stats['payloadBytes'] / 1024:.0f} KB, "
+            + ("from cache" if fig_stats["cached"] else "built")
+            + f" in {fig_stats['buildSeconds']:.2f}s"
+        )
+        # the timings go back into the status panel once everything is drawn
+        if profiler:
+            profiler.stop()
+            status.write("Time per stage:")
+            status.dataframe(profiler.summary(), use_container_width=True, hide_index=True)
+            status.write("Every call:")
+            status.dataframe(profiler.table(), use_container_width=True, hide_index=True)
+            status.download_button(
+                label="Download Chrome trace",
+                data=json.dumps(profiler.chromeTrace()).encode("utf-8"),
+                file_name=f"trace_{year}_{gp}_{sessionType}.json".replace(" ", "_"),
+                mime="application/json",
             )
-    fig = plotAnalysis(session, drivers_data, deltas, ref_driver)
-    st.plotly_chart(fig, use_container_width=True)
+    finally:
+        # always deactivated, also when the run stops early (failed load) or raises
+        if profiler:
+            profiler.stop()
@@ -0,0 +1,119 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fastf1
+import numpy as np
+import pandas as pd
+from telemetry import initCache, loadSession, getFastestLap
+from analysis import computeDeltaMatrix
+
+#the telemetry channels we keep per driver, on top of distance and time
+TELEMETRY_COLUMNS = ['Speed', 'Throttle', 'Brake', 'nGear', 'X', 'Y']
+
+def partitionPath(outDir, table, year, event, sessionType):
+    """
+    Hive-style partition directory (year=/event=/session=) of one table for one session.
+    """
+    return os.path.join(outDir, table, f"year={year}", f"event={event.replace(' ', '_')}",
+                        f"session={sessionType}")
+
+def isDone(outDir, year, event, sessionType):
+    #the marker is written last, a crashed job is simply redone
+    return os.path.exists(os.path.join(partitionPath(outDir, '_progress', year, event, sessionType), '_SUCCESS'))
+
+def _writePartition(df, outDir, table, year, event, sessionType):
+    path = partitionPath(outDir, table, year, event, sessionType)
+    os.makedirs(path, exist_ok=True)
+    tmpFile = os.path.join(path, 'part-0.parquet.tmp')
+    df.to_parquet(tmpFile, index=False)
+    os.replace(tmpFile, os.path.join(path, 'part-0.parquet'))
+
+def processSession(year, event, sessionType, drivers, outDir):
+    """
+    Worker job: loads one session, extracts every driver's fastest lap, computes
+    all the pairwise deltas and writes both tables to the dataset.
+    Returns a short status message.
+    """
+    session = loadSession(year, event, sessionType, drivers=drivers)
+    if session is None:
+        return f"{year} {event} {sessionType}: load failed"
+    if drivers is None:
+        drivers = session.results['Abbreviation'].dropna().unique().tolist()
+
+    names = []
+    telemetries = []
+    frames = []
+    for driver in drivers:
+        lap, tel = getFastestLap(session, driver)
+        if tel is None:
+            continue
+        names.append(driver)
+        telemetries.append(tel)
+        frame = pd.DataFrame({
+            'Driver': driver,
+            'LapNumber': lap['LapNumber'],
+            'LapTime': lap['LapTime'].total_seconds(),
+            'Distance': tel['Distance'].to_numpy(dtype=np.float32),
+            'Time': tel['Time'].dt.total_seconds().to_numpy(dtype=np.float32),
+        })
+        for col in TELEMETRY_COLUMNS:
+            frame[col] = tel[col].to_numpy()
+        frames.append(frame)
+    if not frames:
+        return f"{year} {event} {sessionType}: no telemetry"
+    _writePartition(pd.concat(frames, ignore_index=True), outDir, 'telemetry', year, event, sessionType)
+
+    #long format: one row per (reference, driver, distance), the diagonal is always 0 so we skip it
+    if len(telemetries) > 1:
+        distance, _, deltas = computeDeltaMatrix(telemetries)
+        refIdx, drvIdx = np.nonzero(~np.eye(len(names), dtype=bool))
+        namesArr = np.array(names)
+        deltaDf = pd.DataFrame({
+            'RefDriver': np.repeat(namesArr[refIdx], len(distance)),
+            'Driver': np.repeat(namesArr[drvIdx], len(distance)),
+            'Distance': np.tile(distance, len(refIdx)),
+            'Delta': deltas[refIdx, drvIdx].ravel(),
+        })
+        _writePartition(deltaDf, outDir, 'deltas', year, event, sessionType)
+
+    marker = partitionPath(outDir, '_progress', year, event, sessionType)
+    os.makedirs(marker, exist_ok=True)
+    open(os.path.join(marker, '_SUCCESS'), 'w').close()
+    return f"{year} {event} {sessionType}: {len(names)} drivers"
+
+def runBatch(year, events=None, sessions=('Q',), drivers=None, outDir='batch_output', workers=None, restart=False):
+    """
+    Precomputes fastest-lap telemetry and deltas for a whole season (or some events)
+    into a partitioned Parquet dataset. Finished sessions are skipped, so an
+    interrupted run can just be started again.
+
+    :param year (int): the racing season (e.g, 2024)
+    :param events (list): GP names, the whole season by default
+    :param sessions (list): session codes, e.g. ['Q', 'R']
+    :param drivers (list): driver codes, the whole field by default
+    :param outDir (str): root of the Parquet dataset
+    :param workers (int): number of worker processes, one per core by default
+    :param restart (bool): drop previous progress and recompute everything
+    """
+    if restart and os.path.exists(os.path.join(outDir, '_progress')):
+        shutil.rmtree(os.path.join(outDir, '_progress'))
+    if events is None:
+        initCache()
+        schedule = fastf1.get_event_schedule(year, include_testing=False)
+        events = schedule['EventName'].tolist()
+
+    jobs = [(year, event, sessionType) for event in events for sessionType in sessions]
+    todo = [job for job in jobs if not isDone(outDir, *job)]
+    print(f"{len(jobs) - len(todo)}/{len(jobs)} sessions already done, {len(todo)} to go.")
+    if not todo:
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(processSession, *job, drivers, outDir): job for job in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            job = futures[future]
+            try:
+                print(f"[{i}/{len(todo)}] {future.result()}")
+            except Exception as e:
+                print(f"[{i}/{len(todo)}] {job[0]} {job[1]} {job[2]}: failed ({e})")
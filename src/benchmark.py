@@ -0,0 +1,316 @@
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fastf1
+import numpy as np
+import pandas as pd
+import plotly
+
+import snapshot
+from analysis import computeDeltaMatrix, computeDeltaTime
+from corners import analyzeCorners
+from plotter import measureFigure, plotAnalysis
+from racegap import computeRaceGaps
+from channels import DERIVED_CHANNELS, stackChannels
+from synthetic import makeSession
+from telemetry import getFastestLap
+from track import plotTrackMap
+
+bench_dir = 'benchmarks'
+DRIVER_COUNTS = (2, 5, 20)
+#a qualifying-like session and a full race distance
+LAP_COUNTS = (12, 57)
+#same point budget as the app's fast render mode
+RENDER_MAX_POINTS = 1500
+#seconds a fresh interpreter may spend importing an entry point, before the first prompt or render
+IMPORT_BUDGET = 1.0
+#modules the dashboard imports before drawing anything (streamlit itself is already loaded by the server)
+APP_MODULES = ('telemetry', 'plotter', 'track', 'corners', 'degradation', 'profiler', 'metadata', 'resultcache',
+               'centerline', 'channels', 'laptrace', 'prefetch')
+_SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _measure(fn, repeat):
+    """
+    Runs fn repeat times for the wall time, then once more under tracemalloc for the peak memory
+    (tracemalloc slows python code down, so it is kept out of the timed runs).
+    Returns the stats and the last result of fn.
+    """
+    times = []
+    #the pipeline prints progress, we only want the numbers
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        'wallMin': min(times),
+        'wallMedian': statistics.median(times),
+        'peakBytes': peak,
+    }, result
+
+def _lapCount(session):
+    laps = session.laps['LapNumber'].max()
+    return 0 if pd.isna(laps) else int(laps)
+
+def benchmarkSession(session, drivers, label, repeat=3):
+    """
+    Times every pipeline step on one session for the given drivers, the first one being the reference.
+    Returns a list of result records.
+    """
+    records = []
+    def record(case, stats, **extra):
+        records.append({'case': case, 'source': label, 'drivers': len(drivers),
+                        'laps': _lapCount(session), **stats, **extra})
+
+    stats, fastest = _measure(lambda: [getFastestLap(session, d) for d in drivers], repeat)
+    record('getFastestLap', stats)
+    telemetries = [tel for _, tel in fastest]
+    if any(tel is None for tel in telemetries):
+        print(f"   {label}: some drivers have no fastest lap, skipping the rest")
+        return records
+    ref = drivers[0]
+
+    stats, deltas = _measure(lambda: {d: computeDeltaTime(telemetries[0], tel)
+                                      for d, tel in zip(drivers[1:], telemetries[1:])}, repeat)
+    record('computeDeltaTime', stats)
+    stats, _ = _measure(lambda: computeDeltaMatrix(telemetries), repeat)
+    record('computeDeltaMatrix', stats)
+
+    driversData = {d: {'tel': tel, 'color': '#FFFFFF'} for d, tel in zip(drivers, telemetries)}
+    for case, kwargs in (('plotAnalysis', {}),
+                         ('plotAnalysisFast', {'maxPoints': RENDER_MAX_POINTS, 'webgl': True})):
+        stats, (_, figStats) = _measure(
+            lambda: measureFigure(plotAnalysis, session, driversData, deltas, ref, **kwargs), repeat)
+        record(case, stats, payloadBytes=figStats['payloadBytes'], points=figStats['points'])
+    stats, (_, figStats) = _measure(lambda: measureFigure(plotTrackMap, session, ref, telemetries[0]), repeat)
+    record('plotTrackMap', stats, payloadBytes=figStats['payloadBytes'], points=figStats['points'])
+
+    stats, _ = _measure(lambda: analyzeCorners(session, drivers), repeat)
+    record('analyzeCorners', stats)
+    #the whole field, the gap timeline is always built for every car
+    stats, gaps = _measure(lambda: computeRaceGaps(session), repeat)
+    record('computeRaceGaps', stats, bytes=gaps.nbytes if gaps is not None else 0)
+    #every derived channel of every lap of the selected drivers in one batch
+    stats, _ = _measure(lambda: stackChannels(session, list(DERIVED_CHANNELS), drivers), repeat)
+    record('stackChannels', stats)
+    return records
+
+def _timeStartup(code, args, repeat):
+    #fresh interpreter in an empty directory, so the import can't reuse anything and any file it creates shows up
+    times, created = [], set()
+    returncode, stderr = 0, ''
+    for _ in range(repeat):
+        workDir = tempfile.mkdtemp(prefix='f1import_')
+        try:
+            env = dict(os.environ, PYTHONPATH=_SRC_DIR)
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, *args, '-c', code] if code else [sys.executable, *args],
+                                 cwd=workDir, env=env, capture_output=True, text=True)
+            elapsed = time.perf_counter() - start
+            #with code, the child reports its own import time, without the interpreter start
+            times.append(float(out.stdout.strip().splitlines()[-1]) if code and out.returncode == 0 else elapsed)
+            #a child that crashed is quick, keep its failure so it can't pass the budget
+            if out.returncode:
+                returncode, stderr = out.returncode, out.stderr.strip()
+            created.update(os.listdir(workDir))
+        finally:
+            shutil.rmtree(workDir, ignore_errors=True)
+    return {'wallMin': min(times), 'wallMedian': statistics.median(times), 'peakBytes': 0,
+            'created': sorted(created), 'returncode': returncode, 'stderr': stderr}
+
+def runImports(repeat=3, budget=IMPORT_BUDGET):
+    """
+    Times the startup of every entry point in a fresh interpreter: `main.py --help`, importing telemetry
+    and importing everything the dashboard needs for its first render.
+    Each record says whether it stayed under the budget and lists the files the import created (should be none),
+    an entry point that exits with an error is never within budget.
+    """
+    cases = [
+        ('import telemetry', "import time; t = time.perf_counter(); import telemetry; print(time.perf_counter() - t)", ()),
+        ('import app modules', "import time; t = time.perf_counter(); import " + ", ".join(APP_MODULES)
+         + "; print(time.perf_counter() - t)", ()),
+        ('main.py --help', None, (os.path.join(_SRC_DIR, 'main.py'), '--help')),
+    ]
+    records = []
+    for case, code, args in cases:
+        print(f"Startup: {case}")
+        stats = _timeStartup(code, args, repeat)
+        withinBudget = stats['wallMin'] <= budget and not stats['created'] and stats['returncode'] == 0
+        records.append({'case': case, 'source': 'startup', 'drivers': 0, 'laps': 0, **stats,
+                        'budget': budget, 'withinBudget': withinBudget})
+    return records
+
+def _benchmarkLoad(path, label, driverCount, lapCount, repeat):
+    stats, session = _measure(lambda: snapshot.loadSnapshotFrom(path), repeat)
+    return {'case': 'loadSnapshot', 'source': label, 'drivers': driverCount, 'laps': lapCount, **stats}, session
+
+def runSynthetic(driverCounts=DRIVER_COUNTS, lapCounts=LAP_COUNTS, repeat=3, seed=0):
+    """
+    Benchmarks generated sessions of every (driver count, lap count) combination.
+    Session loading is timed on a snapshot of the generated session written to a temporary directory.
+    """
+    records = []
+    workDir = tempfile.mkdtemp(prefix='f1bench_')
+    try:
+        for nLaps in lapCounts:
+            for nDrivers in driverCounts:
+                label = 'synthetic'
+                print(f"Synthetic session: {nDrivers} drivers, {nLaps} laps")
+                session = makeSession(nDrivers, nLaps, seed=seed)
+                path = os.path.join(workDir, f"{nDrivers}_{nLaps}")
+                previousDir = snapshot.snapshot_dir
+                snapshot.snapshot_dir = path
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        snapshot.writeSnapshot(session, session.event.year, 'synthetic', 'R')
+                    snapPath = snapshot.snapshotPath(session.event.year, 'synthetic', 'R')
+                finally:
+                    snapshot.snapshot_dir = previousDir
+                load, loaded = _benchmarkLoad(snapPath, label, nDrivers, nLaps, repeat)
+                records.append(load)
+                drivers = loaded.laps['Driver'].unique().tolist()[:nDrivers]
+                records.extend(benchmarkSession(loaded, drivers, label, repeat))
+                shutil.rmtree(path, ignore_errors=True)
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return records
+
+def runRecorded(snapshotDir=None, driverCounts=DRIVER_COUNTS, repeat=3):
+    """
+    Benchmarks the recorded session snapshots found in snapshotDir (see snapshot.py),
+    so real sessions can be timed offline once they have been snapshotted.
+    """
+    snapshotDir = snapshotDir or snapshot.snapshot_dir
+    if not os.path.isdir(snapshotDir):
+        print(f"No snapshots in '{snapshotDir}', skipping recorded sessions.")
+        return []
+    records = []
+    for name in sorted(os.listdir(snapshotDir)):
+        path = os.path.join(snapshotDir, name)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            continue
+        print(f"Recorded session: {name}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            session = snapshot.loadSnapshotFrom(path)
+        if session is None:
+            print(f"   {name} is outdated, skipping it")
+            continue
+        #fastest drivers first, like the usual comparisons
+        allDrivers = session.laps.sort_values('LapTime')['Driver'].dropna().unique().tolist()
+        lapCount = _lapCount(session)
+        load, _ = _benchmarkLoad(path, name, len(allDrivers), lapCount, repeat)
+        records.append(load)
+        for n in driverCounts:
+            if n <= len(allDrivers):
+                records.extend(benchmarkSession(session, allDrivers[:n], name, repeat))
+    return records
+
+def environment():
+    """
+    Versions and commit the numbers were taken with.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'date': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'fastf1': fastf1.__version__,
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+    }
+
+def _key(record):
+    return (record['case'], record['source'], record['drivers'], record['laps'])
+
+def compareResults(baseline, current):
+    """
+    Prints current vs baseline for every case both runs have.
+    Ratios above 1 mean the current run is slower / heavier.
+    """
+    old = {_key(r): r for r in baseline['results']}
+    print(f"{'case':<20} {'source':<24} {'drv':>4} {'laps':>5} {'wall':>10} {'ratio':>7} {'peak MB':>9} {'ratio':>7}")
+    for r in current['results']:
+        base = old.get(_key(r))
+        if base is None:
+            continue
+        wallRatio = r['wallMin'] / base['wallMin'] if base['wallMin'] else float('nan')
+        memRatio = r['peakBytes'] / base['peakBytes'] if base['peakBytes'] else float('nan')
+        print(f"{r['case']:<20} {r['source']:<24} {r['drivers']:>4} {r['laps']:>5} "
+              f"{r['wallMin'] * 1000:>8.1f}ms {wallRatio:>7.2f} {r['peakBytes'] / 1e6:>9.1f} {memRatio:>7.2f}")
+
+def printResults(results):
+    print(f"{'case':<20} {'source':<24} {'drv':>4} {'laps':>5} {'wall':>10} {'peak MB':>9} {'payload KB':>11}")
+    for r in results['results']:
+        payload = f"{r['payloadBytes'] / 1e3:.0f}" if 'payloadBytes' in r else '-'
+        print(f"{r['case']:<20} {r['source']:<24} {r['drivers']:>4} {r['laps']:>5} "
+              f"{r['wallMin'] * 1000:>8.1f}ms {r['peakBytes'] / 1e6:>9.1f} {payload:>11}")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the telemetry pipeline")
+    parser.add_argument("--drivers", type=int, nargs='+', default=list(DRIVER_COUNTS), help="Driver counts")
+    parser.add_argument("--laps", type=int, nargs='+', default=list(LAP_COUNTS), help="Lap counts of the synthetic sessions")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic sessions")
+    parser.add_argument("--snapshots", type=str, default=None, help="Also benchmark the recorded snapshots in this directory")
+    parser.add_argument("--no-synthetic", action='store_true', help="Only benchmark recorded snapshots")
+    parser.add_argument("--out", type=str, default=None, help="Result file (default: benchmarks/<date>_<commit>.json)")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline result file to compare against")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET,
+                        help="Seconds an entry point may take to import, the run fails above it")
+    parser.add_argument("--no-imports", action='store_true', help="Skip the startup timings")
+    args = parser.parse_args()
+
+    results = {'environment': environment(), 'results': []}
+    if not args.no_imports:
+        results['results'] += runImports(args.repeat, args.import_budget)
+    if not args.no_synthetic:
+        results['results'] += runSynthetic(args.drivers, args.laps, args.repeat, args.seed)
+    if args.snapshots:
+        results['results'] += runRecorded(args.snapshots, args.drivers, args.repeat)
+
+    out = args.out
+    if out is None:
+        env = results['environment']
+        stamp = env['date'].replace(':', '').replace('-', '')
+        out = os.path.join(bench_dir, f"{stamp}_{env['commit'] or 'nocommit'}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    printResults(results)
+    print(f"Saved to {out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compareResults(json.load(f), results)
+    overBudget = [r for r in results['results'] if r.get('withinBudget') is False]
+    for r in overBudget:
+        created = f", created {', '.join(r['created'])}" if r['created'] else ''
+        failed = f", exited with {r['returncode']}:\n{r['stderr']}" if r.get('returncode') else ''
+        print(f"Startup budget exceeded: {r['case']} took {r['wallMin']:.2f}s (budget {r['budget']:.2f}s){created}{failed}")
+    if overBudget:
+        sys.exit(1)
@@ -0,0 +1,249 @@
+import os
+import threading
+
+import numpy as np
+
+from profiler import traced
+from laptrace import LapTrace, channel
+from telemetry import getFastestLap
+
+centerline_dir = 'centerlines'
+#spacing of the resampled reference line in meters, projections are refined on the segments in between
+POINT_SPACING = 1.0
+#a corner further than this (m) from where it was when the line was built means another layout
+LAYOUT_TOLERANCE = 30.0
+#median distance (m) of a lap from the line above which the line belongs to another layout
+MAX_RESIDUAL = 5.0
+
+class Centerline:
+    """
+    Reference line of a circuit, indexed with a KD-tree, that gives every X/Y sample a track coordinate:
+    the distance along the line from the start/finish line, in meters.
+
+    Laps aligned on it share one coordinate whatever their own integrated Distance says, so gaps don't
+    creep up over the lap and corners land at the same place for every car, lap and session.
+    The scale is the reference lap's Distance, the one circuit_info places the corners on.
+
+    :param points (array): (n x 2) X/Y of the line in position data units, in driving order
+    :param scale (float): meters per position data unit
+    :param layout (array): (n x 2) corner X/Y of the layout it was built on (see layoutFingerprint), None if unknown
+    """
+    def __init__(self, points, scale, layout=None):
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        self.scale = float(scale)
+        self.layout = None if layout is None or not len(layout) else np.asarray(layout, dtype=np.float64)
+        #the line is closed, the last segment goes back to the first point
+        segments = np.roll(self.points, -1, axis=0) - self.points
+        self._segments = segments
+        self._segLengthSq = np.maximum(np.einsum('ij,ij->i', segments, segments), 1e-12)
+        segLength = np.sqrt(self._segLengthSq) * self.scale
+        self._start = np.concatenate(([0.0], np.cumsum(segLength[:-1])))
+        self.length = float(segLength.sum())
+        #scipy takes a quarter of a second to import, only paid once a line is actually built
+        from scipy.spatial import cKDTree
+        self.tree = cKDTree(self.points)
+
+    @classmethod
+    def fromLap(cls, x, y, distance, spacing=POINT_SPACING, layout=None):
+        """
+        Builds the line from one lap: the X/Y samples resampled every `spacing` meters along the lap.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        ok = np.isfinite(x) & np.isfinite(y)
+        x, y = x[ok], y[ok]
+        #arc length of the raw polyline, duplicate samples (car standing or pos data repeated) removed
+        step = np.hypot(np.diff(x), np.diff(y))
+        keep = np.r_[True, step > 0]
+        x, y = x[keep], y[keep]
+        arc = np.concatenate(([0.0], np.cumsum(step[step > 0])))
+        scale = float(np.nanmax(distance)) / arc[-1]
+        samples = np.linspace(0, arc[-1], max(2, int(arc[-1] * scale / spacing)), endpoint=False)
+        return cls(np.column_stack((np.interp(samples, arc, x), np.interp(samples, arc, y))), scale, layout)
+
+    def project(self, x, y, guide=None):
+        """
+        Track coordinate (m) of X/Y samples: nearest point of the line from the KD-tree, then the exact
+        projection on the segment before or after it, for every sample at once.
+
+        Near the start/finish line a sample can land on either side of it. With guide (any distance
+        roughly in line with the track coordinate, e.g. the sample's own Distance) the coordinate is
+        moved by whole laps to the value closest to the guide, so it keeps counting past the line.
+        """
+        p = np.column_stack((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)))
+        n = len(self.points)
+        _, k = self.tree.query(p)
+        #projection on the segment leaving the nearest point...
+        forward = np.einsum('ij,ij->i', p - self.points[k], self._segments[k]) / self._segLengthSq[k]
+        #...or, when the sample is behind it, on the segment arriving at it
+        prev = (k - 1) % n
+        backward = np.einsum('ij,ij->i', p - self.points[prev], self._segments[prev]) / self._segLengthSq[prev]
+        ahead = forward >= 0
+        seg = np.where(ahead, k, prev)
+        t = np.clip(np.where(ahead, forward, backward), 0.0, 1.0)
+        s = self._start[seg] + t * np.sqrt(self._segLengthSq[seg]) * self.scale
+        if guide is not None:
+            s = s + self.length * np.round((np.asarray(guide, dtype=np.float64) - s) / self.length)
+        return s
+
+    def alignDistance(self, x, y, distance):
+        """
+        Track coordinate of one lap's samples, never going backwards (projection noise removed),
+        to use in place of the lap's integrated Distance.
+        """
+        return np.maximum.accumulate(self.project(x, y, guide=distance))
+
+    def residual(self, x, y):
+        """
+        Median distance (m) of X/Y samples from the line, a few meters for a lap of the same layout.
+        """
+        p = np.column_stack((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)))
+        p = p[np.isfinite(p).all(axis=1)]
+        if not len(p):
+            return 0.0
+        dist, _ = self.tree.query(p)
+        return float(np.median(dist)) * self.scale
+
+    def matchesLayout(self, layout):
+        """
+        False if the corners moved, were added or removed since the line was built.
+        An unknown layout on either side matches, the residual check is then all we have.
+        """
+        if layout is None or self.layout is None:
+            return True
+        if layout.shape != self.layout.shape:
+            return False
+        return float(np.hypot(*(layout - self.layout).T).max()) * self.scale <= LAYOUT_TOLERANCE
+
+    def save(self, path):
+        np.savez(path, points=self.points, scale=self.scale,
+                 layout=np.empty((0, 2)) if self.layout is None else self.layout)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            return None
+        #lines saved before the layout was recorded have none
+        return cls(data['points'], float(data['scale']), data['layout'] if 'layout' in data else None)
+
+    def __repr__(self):
+        return f"Centerline({len(self.points)} points, {self.length:.0f} m)"
+
+_centerlines = {}
+_centerlineLock = threading.Lock()
+
+def circuitKey(session):
+    """
+    Key the centerline is cached under: one per circuit, shared by every session and season there
+    as long as the layout doesn't change (see getCenterline).
+    """
+    return str(session.event['Location']).lower().replace(' ', '_')
+
+def layoutFingerprint(session):
+    """
+    Corner X/Y of the session's circuit_info as an (n x 2) array, None if there is no circuit info.
+    """
+    try:
+        circuitInfo = session.get_circuit_info()
+    except Exception:
+        return None
+    if circuitInfo is None or circuitInfo.corners is None or circuitInfo.corners.empty:
+        return None
+    return circuitInfo.corners[['X', 'Y']].to_numpy(dtype=np.float64)
+
+def _referenceLap(session):
+    #the session's fastest lap, the one circuit_info's corner distances are measured on
+    fastest = session.laps.pick_fastest()
+    if fastest is None or fastest.empty:
+        return None
+    _, tel = getFastestLap(session, fastest['Driver'])
+    if tel is None or 'X' not in tel:
+        return None
+    return tel
+
+@traced()
+def getCenterline(session, rebuild=False):
+    """
+    The centerline of the session's circuit: from memory, from disk, or built from the session's
+    fastest lap and saved.
+    A cached line is rebuilt when the circuit's corners moved since it was built (another layout at
+    the same venue), or when the session's fastest lap is further than MAX_RESIDUAL from it, checked
+    once per session.
+    Returns None if the session has no lap with position data.
+    """
+    key = circuitKey(session)
+    path = os.path.join(centerline_dir, f"{key}.npz")
+    layout = layoutFingerprint(session)
+    with _centerlineLock:
+        line = None if rebuild else _centerlines.get(key)
+        if line is None and not rebuild:
+            line = Centerline.load(path)
+        if line is not None and not line.matchesLayout(layout):
+            print(f"Corners of {key} moved since its centerline was built, rebuilding it.")
+            line = None
+        tel = None
+        if line is not None and getattr(session, '_centerline', None) is not line:
+            tel = _referenceLap(session)
+            if tel is not None:
+                residual = line.residual(tel['X'], tel['Y'])
+                if residual > MAX_RESIDUAL:
+                    print(f"Fastest lap is {residual:.1f} m off the {key} centerline, rebuilding it.")
+                    line = None
+        if line is None:
+            tel = tel if tel is not None else _referenceLap(session)
+            if tel is None:
+                return None
+            line = Centerline.fromLap(tel['X'], tel['Y'], tel['Distance'], layout=layout)
+            os.makedirs(centerline_dir, exist_ok=True)
+            line.save(path)
+        #checked against this session, later calls skip the residual check
+        session._centerline = line
+        _centerlines[key] = line
+    return line
+
+def alignTrace(tel, line):
+    """
+    The same lap with Distance replaced by its track coordinate on the centerline.
+    Works for a LapTrace (the other channels are shared, not copied) or a telemetry dataframe,
+    and everything that takes telemetry (deltas, minisectors, plots, export) can use the result.
+    """
+    distance = line.alignDistance(channel(tel, 'X'), channel(tel, 'Y'), channel(tel, 'Distance'))
+    if isinstance(tel, LapTrace):
+        return LapTrace(distance, tel.time, tel.speed, tel.throttle, tel.brake, tel.gear, tel.x, tel.y,
+                        driver=tel.driver, lapNumber=tel.lapNumber, lapTime=tel.lapTime)
+    aligned = tel.copy(deep=False)
+    aligned['Distance'] = distance
+    return aligned
+
+def alignLaps(line, x, y, distance, lapId):
+    """
+    Track coordinate of many laps at once (e.g. the stackLaps arrays), never going backwards within a lap.
+    """
+    s = line.project(x, y, guide=distance)
+    #one running maximum for all laps: each lap is lifted above the previous ones, then put back
+    lift = lapId * 4 * line.length
+    return np.maximum.accumulate(s + lift) - lift
+
+if __name__ == "__main__":
+    import argparse
+    from telemetry import loadSession
+    parser = argparse.ArgumentParser(description="Reference centerlines used to align laps")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--gp", required=True, help="Grand Prix name, e.g. 'Bahrain'")
+    parser.add_argument("--session", default="Q")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the circuit's centerline from this session")
+    args = parser.parse_args()
+
+    session = loadSession(args.year, args.gp, args.session)
+    if session is not None:
+        line = getCenterline(session, args.rebuild)
+        print(f"{circuitKey(session)}: {line}")
+        if line is not None:
+            #how far each driver's fastest lap drifts from the line over a lap
+            for driver in sorted(session.laps['Driver'].dropna().unique()):
+                _, tel = getFastestLap(session, driver)
+                if tel is not None and 'X' in tel:
+                    drift = line.alignDistance(tel['X'], tel['Y'], tel['Distance']) - tel['Distance'].to_numpy()
+                    print(f"{driver}: {drift[-1]:+.1f} m at the line, {np.abs(drift).max():.1f} m max")
@@ -0,0 +1,251 @@
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from profiler import traced
+
+GRAVITY = 9.81
+#X/Y position data is in tenths of a meter
+POSITION_SCALE = 0.1
+#samples averaged (centered) before differentiating, telemetry is too noisy for raw differences
+SMOOTH_SAMPLES = 5
+#throttle (%) under which the car counts as off throttle
+COAST_THROTTLE = 1
+#below this speed (km/h) off throttle and off brake is the pit lane or a spin, not coasting
+COAST_MIN_SPEED = 50
+#FastF1 DRS values from which the flap is open (10, 12 and 14 depending on the season)
+DRS_OPEN = 10
+
+#registered derived channels: name -> {'fn', 'requires', 'unit', 'label'}
+DERIVED_CHANNELS = {}
+
+def registerChannel(name, requires, unit='', label=None):
+    """
+    Decorator registering a derived channel.
+    The function gets a LapChannels and returns one value per sample; it reads its inputs with
+    channels[...] so they are themselves computed (and memoized) on demand.
+
+    :param name (str): channel name, e.g. 'LongG'
+    :param requires (tuple): channels it reads, raw or derived
+    :param unit (str): unit shown on plots
+    :param label (str): axis title, the name by default
+    """
+    def register(fn):
+        DERIVED_CHANNELS[name] = {'fn': fn, 'requires': tuple(requires), 'unit': unit, 'label': label or name}
+        return fn
+    return register
+
+def rawRequirements(names):
+    """
+    The raw telemetry channels the given channels need, through every derived channel they read.
+    """
+    raw, todo, seen = [], list(names), set()
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        if name in DERIVED_CHANNELS:
+            todo.extend(DERIVED_CHANNELS[name]['requires'])
+        else:
+            raw.append(name)
+    return sorted(raw)
+
+class LapChannels:
+    """
+    Raw and derived channels of one lap, or of many laps stacked together (e.g. from telemetry.stackLaps).
+    Derived channels are computed on first access and kept, later reads cost nothing.
+    With stacked laps, filters and differences restart at every lap so laps never bleed into each other.
+
+    :param data (dataframe, LapTrace or dict): the telemetry, 'Time' as timedelta or seconds
+    :param lapId (array): lap of every sample for stacked laps, one lap by default
+    """
+    def __init__(self, data, lapId=None):
+        self.data = data
+        self._values = {}
+        n = len(data['Speed'])
+        lapId = np.zeros(n, dtype=np.int64) if lapId is None else np.asarray(lapId)
+        #first and last sample of every sample's lap, for the segment-aware filters
+        newLap = np.r_[True, lapId[1:] != lapId[:-1]]
+        starts = np.flatnonzero(newLap)
+        ends = np.append(starts[1:], n) - 1
+        lap = np.cumsum(newLap) - 1
+        self.lapStart = starts[lap]
+        self.lapEnd = ends[lap]
+
+    def __len__(self):
+        return len(self.lapStart)
+
+    def __contains__(self, name):
+        if name in self._values:
+            return True
+        if name in DERIVED_CHANNELS:
+            return all(r in self for r in DERIVED_CHANNELS[name]['requires'])
+        return name in self.data
+
+    def __getitem__(self, name):
+        value = self._values.get(name)
+        if value is None:
+            if name in DERIVED_CHANNELS:
+                value = np.asarray(DERIVED_CHANNELS[name]['fn'](self))
+            else:
+                value = np.asarray(self.data[name])
+                if np.issubdtype(value.dtype, np.timedelta64):
+                    value = value / np.timedelta64(1, 's')
+            self._values[name] = value
+        return value
+
+    def compute(self, names):
+        """
+        Returns a dict of the given channels, computing the ones not read yet.
+        """
+        return {name: self[name] for name in names}
+
+    def smooth(self, values, window=SMOOTH_SAMPLES):
+        """
+        Centered moving average, the window shrinking at the start and end of every lap.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        half = window // 2
+        index = np.arange(len(values))
+        lo = np.maximum(index - half, self.lapStart)
+        hi = np.minimum(index + half, self.lapEnd)
+        cum = np.concatenate(([0.0], np.cumsum(values)))
+        return (cum[hi + 1] - cum[lo]) / (hi - lo + 1)
+
+    def gradient(self, values, x=None):
+        """
+        d(values)/dx (per sample without x): central differences, one-sided at the ends of every lap.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        index = np.arange(len(values))
+        lo = np.maximum(index - 1, self.lapStart)
+        hi = np.minimum(index + 1, self.lapEnd)
+        step = (hi - lo).astype(np.float64) if x is None else np.asarray(x, dtype=np.float64)[hi] - x[lo]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            grad = (values[hi] - values[lo]) / step
+        #samples with no time step (repeated timestamps, one-sample laps) take no slope
+        return np.where(np.isfinite(grad), grad, 0.0)
+
+@registerChannel('Acceleration', requires=('Speed', 'Time'), unit='m/s²', label='Acceleration')
+def _acceleration(ch):
+    return ch.gradient(ch.smooth(ch['Speed'] / 3.6), ch['Time'])
+
+@registerChannel('LongG', requires=('Acceleration',), unit='g', label='Longitudinal g')
+def _longG(ch):
+    return ch['Acceleration'] / GRAVITY
+
+@registerChannel('Curvature', requires=('X', 'Y'), unit='1/m', label='Curvature')
+def _curvature(ch):
+    #signed curvature of the smoothed racing line, positive turning left
+    x = ch.smooth(ch['X'] * POSITION_SCALE)
+    y = ch.smooth(ch['Y'] * POSITION_SCALE)
+    dx, dy = ch.gradient(x), ch.gradient(y)
+    ddx, ddy = ch.gradient(dx), ch.gradient(dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = (dx * ddy - dy * ddx) / (dx * dx + dy * dy) ** 1.5
+    return np.where(np.isfinite(k), k, 0.0)
+
+@registerChannel('LatG', requires=('Speed', 'Curvature'), unit='g', label='Lateral g')
+def _latG(ch):
+    v = ch.smooth(ch['Speed'] / 3.6)
+    return v * v * ch['Curvature'] / GRAVITY
+
+@registerChannel('Coasting', requires=('Throttle', 'Brake', 'Speed'), label='Coasting')
+def _coasting(ch):
+    return (ch['Throttle'] < COAST_THROTTLE) & ~ch['Brake'].astype(bool) & (ch['Speed'] > COAST_MIN_SPEED)
+
+@registerChannel('LiftAndCoast', requires=('Coasting', 'Brake'), label='Lift and coast')
+def _liftAndCoast(ch):
+    #coasting stretches that end on the brakes: the driver lifted before the braking zone
+    coasting = ch['Coasting']
+    brake = ch['Brake'].astype(bool)
+    index = np.arange(len(coasting))
+    runStart = coasting & ~np.r_[False, coasting[:-1]] | coasting & (index == ch.lapStart)
+    runEnd = coasting & ~np.r_[coasting[1:], False] | coasting & (index == ch.lapEnd)
+    #does the sample after each run (in the same lap) brake?
+    endsBraking = runEnd & (index < ch.lapEnd) & np.r_[brake[1:], False]
+    run = np.maximum(np.cumsum(runStart) - 1, 0)
+    lifted = np.zeros(max(int(runStart.sum()), 1), dtype=bool)
+    lifted[run[endsBraking]] = True
+    return coasting & lifted[run]
+
+@registerChannel('DRSOpen', requires=('DRS',), label='DRS open')
+def _drsOpen(ch):
+    return np.nan_to_num(np.asarray(ch['DRS'], dtype=np.float64)) >= DRS_OPEN
+
+#one LapChannels per lap object, dropped with the lap (keyed by id since dataframes aren't hashable)
+_laps = {}
+_lapsLock = threading.Lock()
+
+def lapChannels(tel):
+    """
+    The memoized channels of a lap (a telemetry dataframe from getFastestLap or a LapTrace):
+    every derived channel is computed once per lap, whoever asks for it first.
+    """
+    key = id(tel)
+    with _lapsLock:
+        entry = _laps.get(key)
+        if entry is None or entry[0]() is not tel:
+            #the memo only holds the lap weakly, so it goes away with the lap
+            entry = _laps[key] = (weakref.ref(tel), LapChannels(weakref.proxy(tel)))
+            weakref.finalize(tel, _laps.pop, key, None)
+    return entry[1]
+
+def derivedChannel(tel, name):
+    """
+    One channel of a lap, computed on first access and memoized with the lap.
+    """
+    return lapChannels(tel)[name]
+
+@traced(details=('names',))
+def computeChannels(data, names):
+    """
+    Derived channels of many laps at once, e.g. the stackLaps arrays of a whole session.
+    Returns a dict of arrays in the same sample order as data.
+
+    :param data (dict): stacked laps with 'LapId' and the raw channels the names need (see rawRequirements)
+    :param names (list): derived (or raw) channel names
+    """
+    return LapChannels(data, data['LapId']).compute(names)
+
+def stackChannels(session, names, drivers=None):
+    """
+    Stacks every lap of the session (telemetry.stackLaps) with the given derived channels added.
+    Returns None if there is no telemetry.
+    """
+    from telemetry import stackLaps
+    raw = [c for c in rawRequirements(names) if c not in ('Time', 'Distance')]
+    data = stackLaps(session, drivers, raw)
+    if data is None:
+        return None
+    data.update(computeChannels(data, names))
+    return data
+
+def summarizeChannels(data, names):
+    """
+    Per-lap summary of stacked channels: the mean of numeric channels, the share of samples for flags.
+    """
+    frame = pd.DataFrame({'Driver': data['Driver'], 'LapNumber': data['LapNumber'],
+                          **{name: np.asarray(data[name], dtype=np.float64) for name in names}})
+    return frame.groupby(['Driver', 'LapNumber'], sort=False).mean().reset_index()
+
+if __name__ == "__main__":
+    import argparse
+    from telemetry import loadSession
+    parser = argparse.ArgumentParser(description="Derived telemetry channels of every lap of a session")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--gp", required=True, help="Grand Prix name, e.g. 'Bahrain'")
+    parser.add_argument("--session", default="R")
+    parser.add_argument("--drivers", nargs="+", help="Driver codes (default: the whole field)")
+    parser.add_argument("--channels", nargs="+", default=['Coasting', 'LiftAndCoast', 'DRSOpen'],
+                        choices=sorted(DERIVED_CHANNELS), help="Channels to summarize per lap")
+    args = parser.parse_args()
+
+    session = loadSession(args.year, args.gp, args.session)
+    if session is not None:
+        data = stackChannels(session, args.channels, [d.upper() for d in args.drivers] if args.drivers else None)
+        if data is not None:
+            print(summarizeChannels(data, args.channels).to_string(index=False))
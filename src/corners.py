@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+from profiler import traced
+from telemetry import stackLaps
+from centerline import getCenterline, alignLaps
+
+#throttle counts as fully open from this value (FastF1 throttle sometimes tops out just under 100)
+FULL_THROTTLE = 99
+
+@traced()
+def analyzeCorners(session, drivers=None, aligned=False):
+    """
+    Braking point, apex and throttle pickup for every corner of every lap.
+    Returns a tidy dataframe with one row per (driver, lap, corner).
+
+    Each corner owns the track from halfway after the previous corner to halfway to the next one:
+    - BrakeDistance: where the last brake application before the apex starts (NaN if taken flat)
+    - MinSpeed, ApexDistance, ApexGear: the slowest point of the corner
+    - FullThrottleDistance: first point after the apex back at full throttle (NaN if not reached in the corner)
+    :param session (Session): a session loaded with laps and telemetry
+    :param drivers (list): driver codes, every driver by default
+    :param aligned (bool): measure distances along the circuit's centerline instead of each lap's own Distance
+    """
+    corners = session.get_circuit_info().corners
+    cornerDist = corners['Distance'].to_numpy(dtype=np.float64)
+    line = getCenterline(session) if aligned else None
+    if line is not None:
+        cornerDist = line.project(corners['X'], corners['Y'], guide=cornerDist)
+    order = np.argsort(cornerDist)
+    cornerDist = cornerDist[order]
+    cornerNames = (corners['Number'].astype(str) + corners['Letter'].fillna('')).to_numpy()[order]
+    nCorners = len(cornerDist)
+
+    channels = ['Speed', 'Throttle', 'Brake', 'nGear'] + (['X', 'Y'] if line is not None else [])
+    data = stackLaps(session, drivers, channels)
+    if data is None or nCorners == 0:
+        return pd.DataFrame()
+    distance = data['Distance']
+    if line is not None:
+        distance = alignLaps(line, data['X'], data['Y'], distance, data['LapId'])
+    speed = data['Speed'].astype(np.float64)
+    lapId = data['LapId']
+
+    #split every lap at the midpoints between corners
+    edges = (cornerDist[1:] + cornerDist[:-1]) / 2
+    corner = np.searchsorted(edges, distance, side='right')
+    segment = lapId * nCorners + corner
+    #samples are sorted by lap then distance, so each segment is one contiguous block
+    starts = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1]])
+    segOfSample = np.cumsum(np.r_[True, segment[1:] != segment[:-1]]) - 1
+    index = np.arange(len(segment))
+    big = len(segment)
+
+    #apex: first sample at the segment's minimum speed
+    minSpeed = np.minimum.reduceat(speed, starts)
+    apexIdx = np.minimum.reduceat(np.where(speed == minSpeed[segOfSample], index, big), starts)
+
+    #brake onsets (off -> on within the same lap), keep the last one before the apex
+    brake = data['Brake'].astype(bool)
+    onset = brake & ~np.r_[False, brake[:-1]]
+    onset[np.r_[True, lapId[1:] != lapId[:-1]] & brake] = True
+    beforeApex = onset & (index <= apexIdx[segOfSample])
+    brakeIdx = np.maximum.reduceat(np.where(beforeApex, index, -1), starts)
+
+    #first full throttle sample after the apex
+    afterApex = (data['Throttle'] >= FULL_THROTTLE) & (index >= apexIdx[segOfSample])
+    throttleIdx = np.minimum.reduceat(np.where(afterApex, index, big), starts)
+
+    def pick(values, idx, missing):
+        out = np.full(len(idx), np.nan)
+        ok = idx != missing
+        out[ok] = values[idx[ok]]
+        return out
+
+    segCorner = corner[starts]
+    return pd.DataFrame({
+        'Driver': data['Driver'][starts],
+        'LapNumber': data['LapNumber'][starts],
+        'Corner': cornerNames[segCorner],
+        'CornerDistance': cornerDist[segCorner],
+        'BrakeDistance': pick(distance, brakeIdx, -1),
+        'MinSpeed': minSpeed,
+        'ApexDistance': distance[apexIdx],
+        'ApexGear': data['nGear'][apexIdx],
+        'FullThrottleDistance': pick(distance, throttleIdx, big),
+    })
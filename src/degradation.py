@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from profiler import traced
+
+#lap time gained per lap from burning fuel (s/lap), added back so only the tyre effect is left
+FUEL_EFFECT = 0.03
+#track status codes we don't want in a long run: 4 safety car, 5 red flag, 6/7 virtual safety car
+NEUTRALISED_STATUS = '4567'
+
+_STINT_KEY = ['Driver', 'Stint', 'Compound']
+_STATS = ['n', 'sx', 'sy', 'sxx', 'sxy', 'syy']
+
+def cleanLaps(laps, fuelEffect=FUEL_EFFECT):
+    """
+    Keeps the representative laps of the long runs and adds the fuel-corrected lap time.
+    Drops laps without a time or tyre info, in/out laps, the opening lap, deleted laps and
+    laps run (even partly) under safety car, virtual safety car or red flag.
+
+    :param laps (dataframe): session.laps or a subset of it
+    :param fuelEffect (float): seconds gained per lap from fuel burn
+    """
+    laps = pd.DataFrame(laps)
+    keep = (laps['LapTime'].notna() & laps['TyreLife'].notna() & laps['Stint'].notna()
+            & laps['Compound'].notna()
+            & laps['PitInTime'].isna() & laps['PitOutTime'].isna()
+            & (laps['LapNumber'] > 1))
+    if 'Deleted' in laps:
+        keep &= laps['Deleted'].fillna(False) != True
+    status = laps['TrackStatus'].fillna('').astype(str)
+    for code in NEUTRALISED_STATUS:
+        keep &= ~status.str.contains(code, regex=False)
+    laps = laps[keep]
+    return pd.DataFrame({
+        'Driver': laps['Driver'],
+        'Stint': laps['Stint'],
+        'Compound': laps['Compound'],
+        'LapNumber': laps['LapNumber'],
+        'TyreLife': laps['TyreLife'].astype(np.float64),
+        'LapTime': laps['LapTime'].dt.total_seconds(),
+        'CorrectedLapTime': laps['LapTime'].dt.total_seconds() + fuelEffect * laps['LapNumber'],
+    })
+
+class DegradationModel:
+    """
+    Linear tyre degradation per stint: CorrectedLapTime = BaseTime + DegPerLap * TyreLife.
+
+    Every stint only keeps its least-squares sums (n, sums of x, y, x², xy, y²), so all stints
+    are solved together in closed form and adding laps later only refits the stints they belong to.
+
+    :param fuelEffect (float): seconds gained per lap from fuel burn
+    :param minLaps (int): minimum clean laps before a stint gets a fit
+    """
+    def __init__(self, fuelEffect=FUEL_EFFECT, minLaps=3):
+        self.fuelEffect = fuelEffect
+        self.minLaps = minLaps
+        self._reset()
+
+    def _reset(self):
+        self._stats = pd.DataFrame(columns=_STATS, dtype=np.float64,
+                                   index=pd.MultiIndex.from_tuples([], names=_STINT_KEY))
+        self._seen = set() #(driver, lap number) already counted
+        self.stints = self._solve(self._stats)
+
+    def fit(self, laps):
+        """
+        Fits every stint of laps from scratch. Returns the stint table.
+        """
+        self._reset()
+        self.update(laps)
+        return self.stints
+
+    def update(self, laps):
+        """
+        Adds newly completed laps (laps already seen are ignored) and refits only the affected stints.
+        Returns the refitted rows of the stint table.
+        """
+        clean = cleanLaps(laps, self.fuelEffect)
+        keys = list(zip(clean['Driver'], clean['LapNumber']))
+        new = np.fromiter((k not in self._seen for k in keys), dtype=bool, count=len(keys))
+        clean = clean[new]
+        if clean.empty:
+            return self.stints.iloc[0:0]
+        self._seen.update(k for k, isNew in zip(keys, new) if isNew)
+
+        x = clean['TyreLife']
+        y = clean['CorrectedLapTime']
+        sums = pd.DataFrame({'n': 1.0, 'sx': x, 'sy': y, 'sxx': x * x, 'sxy': x * y, 'syy': y * y}) \
+            .groupby([clean['Driver'], clean['Stint'], clean['Compound']]).sum()
+        self._stats = self._stats.add(sums, fill_value=0)
+
+        refit = self._solve(self._stats.loc[sums.index])
+        self.stints = pd.concat([self.stints.drop(index=refit.index, errors='ignore'), refit]).sort_index()
+        return refit
+
+    def _solve(self, stats):
+        #closed-form simple linear regression for every stint at once
+        n, sx, sy, sxx, sxy, syy = (stats[c].to_numpy(dtype=np.float64) for c in _STATS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denom = n * sxx - sx * sx
+            slope = (n * sxy - sx * sy) / denom
+            intercept = (sy - slope * sx) / n
+            #residual sum of squares from the same sums, no second pass over the laps
+            rss = syy - intercept * sy - slope * sxy
+            rmse = np.sqrt(np.maximum(rss, 0) / n)
+        enough = (n >= self.minLaps) & (denom > 0)
+        return pd.DataFrame({
+            'Laps': n.astype(np.int64),
+            'BaseTime': np.where(enough, intercept, np.nan),
+            'DegPerLap': np.where(enough, slope, np.nan),
+            'RMSE': np.where(enough, rmse, np.nan),
+        }, index=stats.index)
+
+@traced()
+def fitDegradation(laps, fuelEffect=FUEL_EFFECT, minLaps=3):
+    """
+    Degradation rate of every stint of every driver.
+    Returns a dataframe indexed by (Driver, Stint, Compound) with the clean lap count,
+    the fuel-corrected base lap time (s), the degradation (s/lap of tyre life) and the fit RMSE (s).
+    """
+    return DegradationModel(fuelEffect, minLaps).fit(laps)
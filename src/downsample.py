@@ -0,0 +1,48 @@
+import numpy as np
+
+def lttbIndices(x, y, nOut):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of the nOut samples that best keep the visual shape of the trace
+    (peaks, braking spikes, gear steps), always including the first and last sample.
+
+    :param x (array): x values, sorted (e.g. distance)
+    :param y (array): y values
+    :param nOut (int): number of points to keep
+    """
+    n = len(x)
+    if nOut >= n or nOut < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+
+    #nOut - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, nOut - 1).astype(np.int64)
+    indices = np.empty(nOut, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(nOut - 2):
+        start, end = edges[i], edges[i + 1]
+        #the third point of the triangle is the average of the next bucket (or the last point)
+        if i + 2 < len(edges):
+            nextStart, nextEnd = edges[i + 1], edges[i + 2]
+        else:
+            nextStart, nextEnd = n - 1, n
+        avgX = x[nextStart:nextEnd].mean()
+        avgY = y[nextStart:nextEnd].mean()
+        area = np.abs((x[a] - avgX) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avgY - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+def downsample(x, y, nOut):
+    """
+    Returns (x, y) reduced to nOut points with LTTB, or unchanged if nOut is None.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if nOut is None:
+        return x, y
+    idx = lttbIndices(x, y, nOut)
+    return x[idx], y[idx]
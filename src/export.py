@@ -0,0 +1,114 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analysis import computeDeltaMatrix
+from profiler import traced
+from laptrace import channel, lapSeconds
+
+#key of the session metadata in the Parquet schema metadata
+METADATA_KEY = b'f1_export'
+
+#one schema for both row kinds, the columns a kind doesn't use are null (and cost almost nothing in Parquet)
+EXPORT_SCHEMA = pa.schema([
+    ('Kind', pa.dictionary(pa.int8(), pa.string())),      #'telemetry' or 'delta'
+    ('Driver', pa.dictionary(pa.int8(), pa.string())),
+    ('RefDriver', pa.dictionary(pa.int8(), pa.string())), #deltas only: the driver the gap is measured to
+    ('Distance', pa.float32()),
+    ('Time', pa.float32()),                                #seconds from the start of the lap
+    ('Speed', pa.float32()),
+    ('Throttle', pa.float32()),
+    ('Brake', pa.bool_()),
+    ('nGear', pa.int8()),
+    ('X', pa.float32()),
+    ('Y', pa.float32()),
+    ('Delta', pa.float32()),                               #deltas only: Driver's time - RefDriver's time (s)
+])
+
+def _column(values, field, n):
+    if values is None:
+        return pa.nulls(n, type=field.type)
+    if pa.types.is_dictionary(field.type):
+        return pa.DictionaryArray.from_arrays(np.zeros(n, dtype=np.int8), pa.array([values]))
+    return pa.array(np.asarray(values).astype(field.type.to_pandas_dtype(), copy=False), type=field.type)
+
+def _batch(n, **columns):
+    #a record batch of the export schema, missing columns are null
+    return pa.record_batch([_column(columns.get(f.name), f, n) for f in EXPORT_SCHEMA], schema=EXPORT_SCHEMA)
+
+def _telemetryBatch(driver, tel):
+    return _batch(
+        len(tel), Kind='telemetry', Driver=driver,
+        Distance=channel(tel, 'Distance'),
+        Time=lapSeconds(tel),
+        **{c: np.asarray(tel[c]) for c in ('Speed', 'Throttle', 'Brake', 'nGear', 'X', 'Y') if c in tel},
+    )
+
+def _metadata(session, driversData, refDriver, year, grandPrix, sessionType):
+    import fastf1
+    return {
+        'year': year if year is not None else int(session.event.year),
+        'event': grandPrix or session.event['EventName'],
+        'session': sessionType or session.name,
+        'reference': refDriver,
+        'drivers': {
+            driver: {
+                'lapTime': data['lapTime'].total_seconds() if pd.notna(data.get('lapTime')) else None,
+                'color': data.get('color'),
+            } for driver, data in driversData.items()
+        },
+        'fastf1': fastf1.__version__,
+        'exported': pd.Timestamp.now('UTC').isoformat(timespec='seconds'),
+    }
+
+@traced()
+def exportAnalysis(sink, session, driversData, refDriver=None, year=None, grandPrix=None, sessionType=None,
+                   step=1.0, compression='zstd'):
+    """
+    Writes every driver's lap telemetry, the gaps between every pair of drivers and the session
+    metadata to one Parquet file. Every driver's telemetry and every pair's gaps are their own
+    row group, so only one chunk is encoded at a time.
+
+    :param sink (str or file): output path or a writable binary file (e.g. BytesIO)
+    :param driversData (dict): driver -> {'tel': telemetry, 'color': ..., 'lapTime': ...}, as for plotAnalysis
+    :param refDriver (str): reference driver, only stored in the metadata
+    :param step (float): distance resolution of the deltas in meters
+    """
+    drivers = list(driversData)
+    meta = _metadata(session, driversData, refDriver, year, grandPrix, sessionType)
+    schema = EXPORT_SCHEMA.with_metadata({METADATA_KEY: json.dumps(meta).encode('utf-8')})
+    with pq.ParquetWriter(sink, schema, compression=compression) as writer:
+        for driver in drivers:
+            writer.write_batch(_telemetryBatch(driver, driversData[driver]['tel']))
+        if len(drivers) > 1:
+            distance, _, deltas = computeDeltaMatrix([driversData[d]['tel'] for d in drivers], step)
+            for i, ref in enumerate(drivers):
+                for j, driver in enumerate(drivers):
+                    if i == j:
+                        continue
+                    writer.write_batch(_batch(len(distance), Kind='delta', Driver=driver, RefDriver=ref,
+                                              Distance=distance, Delta=deltas[i, j]))
+    return meta
+
+def exportAnalysisBytes(session, driversData, refDriver=None, **kwargs):
+    """
+    Same as exportAnalysis but returns the file content, e.g. for a download button.
+    """
+    buffer = io.BytesIO()
+    exportAnalysis(buffer, session, driversData, refDriver, **kwargs)
+    return buffer.getvalue()
+
+def readExport(path):
+    """
+    Reads an export back. Returns (telemetry, deltas, metadata).
+    """
+    meta = json.loads(pq.read_schema(path).metadata[METADATA_KEY])
+    #each kind only reads its own columns, so no null-padded column changes dtype
+    telemetry = pq.read_table(path, filters=[('Kind', '=', 'telemetry')],
+                              columns=['Driver', 'Distance', 'Time', 'Speed', 'Throttle', 'Brake', 'nGear', 'X', 'Y'])
+    deltas = pq.read_table(path, filters=[('Kind', '=', 'delta')], columns=['RefDriver', 'Driver', 'Distance', 'Delta'])
+    return telemetry.to_pandas(), deltas.to_pandas(), meta
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+#the channels a LapTrace keeps: column name -> (attribute, dtype)
+TRACE_CHANNELS = {
+    'Distance': ('distance', np.float32),
+    'Time': ('time', np.float32), #seconds from the start of the lap
+    'Speed': ('speed', np.float32),
+    'Throttle': ('throttle', np.int8), #0-100, the odd sensor glitch at 104 still fits
+    'Brake': ('brake', np.bool_),
+    'nGear': ('gear', np.int8),
+    'X': ('x', np.float32),
+    'Y': ('y', np.float32),
+}
+
+class LapTrace:
+    """
+    One lap reduced to the channels the dashboard uses, as contiguous typed numpy arrays.
+    About 23 bytes per sample instead of the few hundred of a full FastF1 Telemetry frame.
+
+    Channels are read like dataframe columns (trace['Speed']) and come back as numpy arrays,
+    'Time' being in seconds. analysis, plotter, track and export accept a LapTrace wherever they
+    take telemetry.
+    """
+    #__weakref__ so per-lap caches (channels.lapChannels) can drop their entry with the trace
+    __slots__ = ('driver', 'lapNumber', 'lapTime', 'distance', 'time', 'speed', 'throttle', 'brake', 'gear', 'x', 'y',
+                 '__weakref__')
+
+    def __init__(self, distance, time, speed, throttle, brake, gear, x, y, driver=None, lapNumber=None, lapTime=None):
+        self.driver = driver
+        self.lapNumber = lapNumber
+        self.lapTime = lapTime
+        #ascontiguousarray doesn't copy when the data already has the right dtype and layout
+        for column, value in zip(TRACE_CHANNELS, (distance, time, speed, throttle, brake, gear, x, y)):
+            attr, dtype = TRACE_CHANNELS[column]
+            setattr(self, attr, np.ascontiguousarray(value, dtype=dtype))
+
+    @classmethod
+    def fromDataFrame(cls, df, driver=None, lapNumber=None, lapTime=None):
+        """
+        Builds a trace from a FastF1 telemetry frame (Time as timedelta) or from toDataFrame's output
+        (Time in seconds). Columns that already have the trace dtype are not copied.
+        Missing channels (e.g. X/Y without position data) are filled with NaN or 0.
+        """
+        n = len(df)
+        values = {}
+        for column, (attr, dtype) in TRACE_CHANNELS.items():
+            if column not in df:
+                values[attr] = np.full(n, np.nan if np.issubdtype(dtype, np.floating) else 0, dtype=dtype)
+            elif df[column].dtype == dtype:
+                values[attr] = df[column].to_numpy()
+            elif column == 'Time' and pd.api.types.is_timedelta64_dtype(df[column]):
+                values[attr] = df[column].dt.total_seconds().to_numpy(dtype=dtype)
+            else:
+                values[attr] = df[column].to_numpy(dtype=dtype, na_value=0 if dtype in (np.int8, np.bool_) else np.nan)
+        return cls(**values, driver=driver, lapNumber=lapNumber, lapTime=lapTime)
+
+    @classmethod
+    def fromLap(cls, lap, tel):
+        """
+        Builds a trace from a FastF1 Lap and its telemetry (as returned by getFastestLap).
+        """
+        return cls.fromDataFrame(tel, lap['Driver'], lap['LapNumber'], lap['LapTime'])
+
+    def toDataFrame(self):
+        """
+        The channels as a dataframe sharing the trace's arrays (no copy), Time in seconds.
+        """
+        return pd.DataFrame({column: getattr(self, attr) for column, (attr, _) in TRACE_CHANNELS.items()},
+                            copy=False)
+
+    def __getitem__(self, column):
+        try:
+            return getattr(self, TRACE_CHANNELS[column][0])
+        except KeyError:
+            raise KeyError(column) from None
+
+    def __contains__(self, column):
+        return column in TRACE_CHANNELS
+
+    def __len__(self):
+        return len(self.distance)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, attr).nbytes for attr, _ in TRACE_CHANNELS.values())
+
+    def __repr__(self):
+        return f"LapTrace({self.driver} lap {self.lapNumber}, {len(self)} samples, {self.nbytes} bytes)"
+
+def channel(tel, column, dtype=np.float64):
+    """
+    A channel of a LapTrace or of a telemetry dataframe as a numpy array.
+    """
+    return np.asarray(tel[column], dtype=dtype)
+
+def lapSeconds(tel):
+    """
+    Time from the start of the lap in seconds, for a LapTrace or a telemetry dataframe.
+    """
+    if isinstance(tel, LapTrace):
+        return tel.time.astype(np.float64)
+    return tel['Time'].dt.total_seconds().to_numpy()
@@ -0,0 +1,308 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from fastf1._api import parse
+from fastf1.utils import to_datetime
+
+class RingBuffer:
+    """
+    Fixed-size buffer of float64 samples, one array per field.
+    Appending never reallocates, the oldest samples are overwritten.
+    """
+    def __init__(self, capacity, fields):
+        self.capacity = capacity
+        self.data = {f: np.zeros(capacity) for f in fields}
+        self.count = 0 #total samples ever appended
+
+    def append(self, **values):
+        n = len(next(iter(values.values())))
+        #only the newest capacity samples can survive anyway
+        skip = max(0, n - self.capacity)
+        pos = (self.count + skip + np.arange(n - skip)) % self.capacity
+        for f, v in values.items():
+            self.data[f][pos] = np.asarray(v)[skip:]
+        self.count += n
+
+    def last(self, field):
+        return self.data[field][(self.count - 1) % self.capacity]
+
+    def tail(self, field, n):
+        """
+        The newest n samples of a field, oldest first.
+        """
+        n = min(n, self.count, self.capacity)
+        pos = (self.count - n + np.arange(n)) % self.capacity
+        return self.data[field][pos]
+
+class _DriverState:
+    def __init__(self, nGrid, capacity):
+        self.buffer = RingBuffer(capacity, ('t', 'lapTime', 'distance', 'speed'))
+        self.lapStart = None #time of the last line crossing, None until the first one
+        self.lapTimeGrid = np.full(nGrid, np.nan) #lap time at every grid metre of the current lap
+        self.delta = np.full(nGrid, np.nan) #gap to the reference lap at every grid metre
+        self.filled = 0 #grid points of the current lap already interpolated
+
+class LiveDelta:
+    """
+    Incremental gap-to-reference over the current lap.
+
+    Car data samples are appended to a ring buffer per driver and integrated into lap distance.
+    Only the grid metres covered by the new samples are interpolated, and compared to the reference
+    driver's last complete lap, so each update costs as much as the new samples, not the whole lap.
+
+    :param refDriver (str): reference car number
+    :param step (float): grid spacing in meters
+    :param maxLapLength (float): longest lap we expect, in meters
+    :param capacity (int): samples kept per driver
+    """
+    def __init__(self, refDriver, step=1.0, maxLapLength=8000, capacity=4096):
+        self.refDriver = refDriver
+        self.step = step
+        self.nGrid = int(maxLapLength / step) + 1
+        self.capacity = capacity
+        self.drivers = {}
+        self.refLap = None #lap time grid of the reference's last complete lap
+        self._lock = threading.Lock()
+
+    def _state(self, driver):
+        if driver not in self.drivers:
+            self.drivers[driver] = _DriverState(self.nGrid, self.capacity)
+        return self.drivers[driver]
+
+    def addSamples(self, driver, t, speed):
+        """
+        Appends car data samples (session time in s, speed in km/h) and updates that driver's gap.
+        """
+        t = np.asarray(t, dtype=np.float64)
+        speed = np.asarray(speed, dtype=np.float64)
+        with self._lock:
+            state = self._state(driver)
+            if state.lapStart is None:
+                #no line crossing seen yet, we can't place the car on the lap
+                state.buffer.append(t=t, lapTime=np.full(len(t), np.nan), distance=np.full(len(t), np.nan), speed=speed)
+                return
+            if state.buffer.count and not np.isnan(state.buffer.last('distance')):
+                prevT = state.buffer.last('t')
+                prevDist = state.buffer.last('distance')
+            else:
+                prevT, prevDist = state.lapStart, 0.0
+            dt = np.diff(np.concatenate(([prevT], t)))
+            distance = prevDist + np.cumsum(speed / 3.6 * dt)
+            lapTime = t - state.lapStart
+            state.buffer.append(t=t, lapTime=lapTime, distance=distance, speed=speed)
+
+            #only the grid metres reached by this batch
+            start = state.filled
+            end = min(int(distance[-1] / self.step) + 1, self.nGrid)
+            if end <= start:
+                return
+            grid = np.arange(start, end) * self.step
+            xp = np.concatenate(([prevDist], distance))
+            fp = np.concatenate(([prevT - state.lapStart], lapTime))
+            state.lapTimeGrid[start:end] = np.interp(grid, xp, fp)
+            if self.refLap is not None:
+                refEnd = min(end, len(self.refLap))
+                if refEnd > start:
+                    state.delta[start:refEnd] = state.lapTimeGrid[start:refEnd] - self.refLap[start:refEnd]
+            state.filled = end
+
+    def lapCompleted(self, driver, t):
+        """
+        The driver crossed the line at session time t: the reference lap is kept, then a new lap starts.
+        """
+        with self._lock:
+            state = self._state(driver)
+            if driver == self.refDriver and state.lapStart is not None and state.filled > 1:
+                self.refLap = state.lapTimeGrid[:state.filled].copy()
+            state.lapStart = t
+            state.filled = 0
+            state.lapTimeGrid[:] = np.nan
+            state.delta[:] = np.nan
+            #the next samples integrate from the line
+            state.buffer.append(t=[t], lapTime=[0.0], distance=[0.0], speed=[state.buffer.last('speed') if state.buffer.count else 0.0])
+
+    def gaps(self):
+        """
+        Latest gap to the reference of every driver (s, positive = slower than the reference lap).
+        """
+        with self._lock:
+            return {
+                driver: float(state.delta[state.filled - 1])
+                for driver, state in self.drivers.items()
+                if state.filled and not np.isnan(state.delta[state.filled - 1])
+            }
+
+    def driverNumbers(self):
+        """
+        Car numbers seen so far, safe to iterate while the stream adds new cars.
+        """
+        with self._lock:
+            return list(self.drivers)
+
+    def deltaTrace(self, driver):
+        """
+        Distance and gap arrays of the driver's current lap so far.
+        """
+        with self._lock:
+            state = self.drivers.get(driver)
+            if state is None:
+                return np.array([]), np.array([])
+            return np.arange(state.filled) * self.step, state.delta[:state.filled].copy()
+
+def _parseLine(line):
+    #same fixes as FastF1's LiveTimingData, the recorder writes python reprs
+    line = line.replace("'", '"').replace('True', 'true').replace('False', 'false')
+    try:
+        category, message, timestamp = json.loads(line)
+    except (json.JSONDecodeError, ValueError):
+        return None
+    return category, message, to_datetime(timestamp) if timestamp else None
+
+def replayMessages(path, speed=1.0):
+    """
+    Yields (category, message, utc timestamp) from a FastF1 live timing recording,
+    paced like the real session divided by speed (speed=0 replays as fast as possible).
+    """
+    firstTs = None
+    startClock = time.perf_counter()
+    with open(path) as f:
+        for line in f:
+            parsed = _parseLine(line)
+            if parsed is None or parsed[2] is None:
+                continue
+            if speed:
+                if firstTs is None:
+                    firstTs = parsed[2]
+                due = (parsed[2] - firstTs).total_seconds() / speed
+                wait = due - (time.perf_counter() - startClock)
+                if wait > 0:
+                    time.sleep(wait)
+            yield parsed
+
+def followMessages(path, poll=0.1, stopEvent=None):
+    """
+    Yields messages as they are appended to a recording that is still being written,
+    e.g. by 'python -m fastf1.livetiming save <path>' running next to the app.
+    """
+    while not os.path.exists(path):
+        time.sleep(poll)
+    with open(path) as f:
+        buffer = ''
+        while stopEvent is None or not stopEvent.is_set():
+            chunk = f.readline()
+            if not chunk:
+                time.sleep(poll)
+                continue
+            buffer += chunk
+            if not buffer.endswith('\n'):
+                continue
+            parsed = _parseLine(buffer)
+            buffer = ''
+            if parsed is not None and parsed[2] is not None:
+                yield parsed
+
+class LiveSession:
+    """
+    Feeds live timing messages into a LiveDelta and keeps the end-to-end update latency
+    (from reading a message to the gaps being updated).
+
+    :param refDriver (str): reference driver, code (e.g. 'VER') or car number
+    """
+    def __init__(self, refDriver, step=1.0):
+        self.refDriver = refDriver
+        self.delta = LiveDelta(refDriver, step)
+        self.abbreviations = {} #car number -> code, from the DriverList messages
+        self.laps = {} #car number -> laps completed
+        self.t0 = None #first CarData Utc, every session time is measured from it
+        self.lastUtc = None #newest CarData Utc, the clock line crossings are placed on
+        self.latencies = RingBuffer(10000, ('ms',))
+        self.messages = 0
+
+    def _seconds(self, utc):
+        #one clock for samples and line crossings: the car data Utc, which runs behind the receive time
+        if self.t0 is None:
+            self.t0 = utc
+        return (utc - self.t0).total_seconds()
+
+    def feed(self, category, message, ts):
+        received = time.perf_counter()
+        if category == 'CarData.z':
+            data = parse(message, zipped=True)
+            for entry in data.get('Entries', []):
+                utc = to_datetime(entry['Utc'])
+                if self.lastUtc is None or utc > self.lastUtc:
+                    self.lastUtc = utc
+                t = self._seconds(utc)
+                for number, car in entry.get('Cars', {}).items():
+                    self.delta.addSamples(number, [t], [car['Channels'].get('2', 0)])
+        elif category == 'TimingData':
+            data = message if isinstance(message, dict) else parse(message)
+            for number, line in data.get('Lines', {}).items():
+                laps = line.get('NumberOfLaps') if isinstance(line, dict) else None
+                if laps is not None and laps != self.laps.get(number):
+                    self.laps[number] = laps
+                    #the crossing on the car data clock: the line's own Utc if it has one, else the newest sample
+                    utc = to_datetime(line['Utc']) if line.get('Utc') else self.lastUtc
+                    if utc is not None:
+                        self.delta.lapCompleted(number, self._seconds(utc))
+        elif category == 'DriverList':
+            data = message if isinstance(message, dict) else parse(message)
+            for number, info in data.items():
+                if isinstance(info, dict) and 'Tla' in info:
+                    self.abbreviations[number] = info['Tla']
+                    if info['Tla'] == self.refDriver:
+                        self.delta.refDriver = number
+        else:
+            return
+        self.messages += 1
+        self.latencies.append(ms=[(time.perf_counter() - received) * 1000])
+
+    def run(self, messages, stopEvent=None):
+        """
+        Consumes a message iterator (replayMessages or followMessages) until it ends or stopEvent is set.
+        """
+        for category, message, ts in messages:
+            if stopEvent is not None and stopEvent.is_set():
+                break
+            self.feed(category, message, ts)
+
+    def gaps(self):
+        """
+        Latest gap of every driver, keyed by driver code when known.
+        """
+        return {self.abbreviations.get(k, k): v for k, v in self.delta.gaps().items()}
+
+    def latencyStats(self):
+        """
+        Update latency percentiles in milliseconds over the last 10000 messages.
+        """
+        ms = self.latencies.tail('ms', self.latencies.count)
+        if not len(ms):
+            return {}
+        return {
+            'messages': self.messages,
+            'p50': float(np.percentile(ms, 50)),
+            'p95': float(np.percentile(ms, 95)),
+            'max': float(ms.max()),
+        }
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay a FastF1 live timing recording")
+    parser.add_argument("file", type=str, help="Recording made with 'python -m fastf1.livetiming save'")
+    parser.add_argument("--ref", type=str, required=True, help="Reference driver code")
+    parser.add_argument("--speed", type=float, default=0, help="Replay speed (0 = as fast as possible)")
+    args = parser.parse_args()
+
+    live = LiveSession(args.ref.upper())
+    start = time.perf_counter()
+    live.run(replayMessages(args.file, args.speed))
+    print(f"Replayed {live.messages} messages in {time.perf_counter() - start:.1f}s")
+    for driver, gap in sorted(live.gaps().items(), key=lambda item: item[1]):
+        print(f"   {driver:<4} {gap:+.3f}s")
+    stats = live.latencyStats()
+    if stats:
+        print(f"Update latency: p50 {stats['p50']:.3f} ms, p95 {stats['p95']:.3f} ms, max {stats['max']:.3f} ms")
@@ -1,10 +1,7 @@
-import matplotlib.pyplot as plt
 import argparse
 import sys
-import fastf1
-from telemetry import loadSession, getFastestLap
-from plotter import plotAnalysis
-from analysis import computeDeltaTime
+#the analysis stack (pandas, FastF1, plotly) is imported once we know what to run,
+#so --help and the first wizard prompt come up straight away
 
 def interactiveInput():
     """
@@ -24,8 +21,15 @@ def interactiveInput():
             print(" Invalid number.")
 
     # 2. Select Grand Prix (Fetch Schedule)
-    print(f"\n Fetching {year} Schedule...")
-    schedule = fastf1.get_event_schedule(year, include_testing=False)
+    # the local index first (see metadata.py), the API if this season isn't indexed
+    from metadata import listEvents, listEntries
+    from telemetry import initCache
+    schedule = listEvents(year)
+    if schedule.empty:
+        import fastf1
+        initCache()
+        print(f"\n Fetching {year} Schedule...")
+        schedule = fastf1.get_event_schedule(year, include_testing=False)
     
     # Filter out future races (optional, but keeps list clean)
     # displaying only RoundNumber and EventName
@@ -59,19 +63,21 @@ def interactiveInput():
     # 4. Select Drivers (Fetch Entry List)
     print(f"\n Loading Driver List for {gpName}...")
     
-    # We do a 'light' load just to get the drivers (no telemetry yet)
+    # We do a 'light' load just to get the drivers (no telemetry yet), unless the session is indexed
     try:
-        session = fastf1.get_session(year, gpName, sessionType)
-        session.load(telemetry=False, laps=False, weather=False)
+        results = listEntries(year, gpName, sessionType)
+        if results.empty:
+            import fastf1
+            initCache()
+            session = fastf1.get_session(year, gpName, sessionType)
+            session.load(telemetry=False, laps=False, weather=False)
+            results = session.results
         
         # Show drivers sorted by team
         print("\n   Code  |  Driver             |  Team")
         print("   ------+---------------------+------------------")
         # get driver list from session results
-        results = session.results
-        for driver in session.drivers:
-            # Look up driver info in the results table
-            info = results.loc[driver]
+        for _, info in results.iterrows():
             print(f"   {info['Abbreviation']:<5} |  {info['FullName']:<19} | {info['TeamName']}")
             
     except Exception as e:
@@ -94,11 +100,37 @@ def parse_args():
     parser.add_argument("--session", type=str, default="Q", help="Session type")
     parser.add_argument("--driver1", type=str, help="Code for Driver 1")
     parser.add_argument("--driver2", type=str, help="Code for Driver 2")
+    parser.add_argument("--profile", action="store_true", help="Print the time and memory spent in every stage")
+    parser.add_argument("--trace", type=str, help="Save the stage timings as a Chrome trace JSON file")
+    parser.add_argument("--export", type=str, help="Save telemetry, deltas and metadata to this Parquet file")
     return parser.parse_args()
 
+def parse_batch_args(argv):
+    """
+    Parse command line arguments for the headless 'batch' mode.
+    """
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Precompute a season of telemetry and deltas to Parquet")
+    parser.add_argument("--year", type=int, required=True, help="Season to process")
+    parser.add_argument("--events", nargs="+", help="Grand Prix names (default: the whole season)")
+    parser.add_argument("--sessions", nargs="+", default=["Q"], help="Session types (e.g. Q R)")
+    parser.add_argument("--drivers", nargs="+", help="Driver codes (default: the whole field)")
+    parser.add_argument("--out", type=str, default="batch_output", help="Output dataset directory")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--restart", action="store_true", help="Ignore previous progress")
+    return parser.parse_args(argv)
+
 def main():
+    # Headless batch mode, no plotting at all
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        args = parse_batch_args(sys.argv[2:])
+        from batch import runBatch
+        drivers = [d.upper() for d in args.drivers] if args.drivers else None
+        runBatch(args.year, args.events, args.sessions, drivers, args.out, args.workers, args.restart)
+        return
+
     # Check if arguments were provided (Fast Mode)
     # If only script name is present (len=1), go Interactive
+    profile, tracePath, exportPath = False, None, None
     if len(sys.argv) == 1:
         year, gp, sessionType, driver1, driver2 = interactiveInput()
     else:
@@ -113,6 +145,7 @@ def main():
         sessionType = args.session
         driver1 = args.driver1.upper()
         driver2 = args.driver2.upper()
+        profile, tracePath, exportPath = args.profile, args.trace, args.export
 
     print(f"\n🚀 Starting Analysis: {year} {gp} [{sessionType}]")
     print(f"⚔️  Duel: {driver1} vs {driver2}")
@@ -121,8 +154,19 @@ def main():
         print("Error: Please select two different drivers.")
         return
 
-    # Load Data (Full Load)
-    session = loadSession(year, gp, sessionType)
+    import fastf1.plotting
+    from telemetry import initCache, loadSession, getFastestLap
+    from plotter import plotAnalysis
+    from analysis import computeDeltaTime
+    from profiler import Profiler
+    from export import exportAnalysis
+    initCache()
+
+    # Stage timings, only collected when asked for
+    profiler = Profiler().start() if profile or tracePath else None
+
+    # Load Data (only the two drivers we compare)
+    session = loadSession(year, gp, sessionType, drivers=[driver1, driver2])
     if not session:
         print("Session load failed.")
         return
@@ -135,14 +179,30 @@ def main():
         print("Could not extract telemetry for one or both drivers.")
         return
     
-    # Compute Delta
+    # Compute Delta (driver 1 is the reference)
     deltaData = computeDeltaTime(d1Tel, d2Tel)
     
     # Plot
-    plotAnalysis(session, d1Tel, driver1, d2Tel, driver2, deltaData)
+    driversData = {
+        driver1: {'tel': d1Tel, 'color': fastf1.plotting.get_driver_color(driver1, session=session), 'lapTime': d1Lap['LapTime']},
+        driver2: {'tel': d2Tel, 'color': fastf1.plotting.get_driver_color(driver2, session=session), 'lapTime': d2Lap['LapTime']},
+    }
+    fig = plotAnalysis(session, driversData, {driver2: deltaData}, driver1)
+    if exportPath:
+        exportAnalysis(exportPath, session, driversData, driver1, year=year, grandPrix=gp, sessionType=sessionType)
+        print(f"Export saved to {exportPath}")
+
+    if profiler:
+        profiler.stop()
+        if profile:
+            print("\nPipeline profile:")
+            print(profiler.report())
+        if tracePath:
+            profiler.saveChromeTrace(tracePath)
+            print(f"Chrome trace saved to {tracePath}")
     
     print("\nDashboard generated successfully!")
-    plt.show()
+    fig.show()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,180 @@
+import os
+import sqlite3
+
+import pandas as pd
+
+from telemetry import initCache, loadSessionLight
+
+index_path = 'metadata.sqlite'
+FIRST_YEAR = 2018
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    year INTEGER, round INTEGER, name TEXT, country TEXT, location TEXT, date TEXT, format TEXT,
+    PRIMARY KEY (year, round)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    year INTEGER, round INTEGER, code TEXT, name TEXT, date_utc TEXT,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending, done or failed
+    PRIMARY KEY (year, round, code)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    year INTEGER, round INTEGER, code TEXT,
+    number TEXT, abbreviation TEXT, full_name TEXT, team TEXT, team_color TEXT,
+    PRIMARY KEY (year, round, code, number)
+);
+CREATE INDEX IF NOT EXISTS events_by_name ON events (year, name);
+"""
+
+def _connect(create=False):
+    """
+    Opens the index, None if it doesn't exist yet and create is False.
+    """
+    if not create and not os.path.exists(index_path):
+        return None
+    conn = sqlite3.connect(index_path)
+    if create:
+        conn.executescript(_SCHEMA)
+    return conn
+
+def _isoformat(ts):
+    return None if pd.isna(ts) else pd.Timestamp(ts).isoformat()
+
+def indexSchedule(conn, year):
+    """
+    Stores the season's events and sessions. Sessions already indexed keep their status.
+    """
+    #only needed to build the index, reading it never loads FastF1
+    import fastf1
+    from fastf1.events import _SESSION_TYPE_ABBREVIATIONS
+    initCache()
+    #schedule session name -> the code the app and get_session use ('Qualifying' -> 'Q')
+    sessionCodes = {name: code for code, name in _SESSION_TYPE_ABBREVIATIONS.items()}
+    schedule = fastf1.get_event_schedule(year, include_testing=False)
+    for _, event in schedule.iterrows():
+        conn.execute(
+            "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (year, int(event['RoundNumber']), event['EventName'], event['Country'], event['Location'],
+             _isoformat(event['EventDate']), event['EventFormat']))
+        for i in range(1, 6):
+            name = event.get(f'Session{i}')
+            code = sessionCodes.get(name)
+            if code is None:
+                continue
+            conn.execute(
+                "INSERT INTO sessions (year, round, code, name, date_utc) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (year, round, code) DO UPDATE SET name = excluded.name, date_utc = excluded.date_utc",
+                (year, int(event['RoundNumber']), code, name, _isoformat(event.get(f'Session{i}DateUtc'))))
+    conn.commit()
+    return len(schedule)
+
+def indexEntries(conn, year, roundNumber, code):
+    """
+    Stores the entry list of one session (from a light load). Returns True on success.
+    """
+    session = loadSessionLight(year, roundNumber, code)
+    results = session.results if session is not None else None
+    if results is None or results.empty:
+        conn.execute("UPDATE sessions SET status = 'failed' WHERE year = ? AND round = ? AND code = ?",
+                     (year, roundNumber, code))
+        conn.commit()
+        return False
+    conn.execute("DELETE FROM entries WHERE year = ? AND round = ? AND code = ?", (year, roundNumber, code))
+    conn.executemany(
+        "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(year, roundNumber, code, str(row['DriverNumber']), row['Abbreviation'], row['FullName'],
+          row['TeamName'], f"#{row['TeamColor']}" if pd.notna(row['TeamColor']) and row['TeamColor'] else None)
+         for _, row in results.iterrows()])
+    conn.execute("UPDATE sessions SET status = 'done' WHERE year = ? AND round = ? AND code = ?",
+                 (year, roundNumber, code))
+    conn.commit()
+    return True
+
+def updateIndex(years=None, force=False):
+    """
+    Builds or refreshes the index. Schedules are always refetched (one request per season),
+    entry lists are only loaded for sessions that already took place and aren't indexed yet,
+    so running it again after a race weekend only fetches the new sessions.
+
+    :param years (list): seasons to index, 2018 to the current season by default
+    :param force (bool): reload every entry list, even those already indexed
+    """
+    if years is None:
+        years = range(FIRST_YEAR, pd.Timestamp.now().year + 1)
+    conn = _connect(create=True)
+    now = pd.Timestamp.now('UTC').tz_localize(None).isoformat()
+    try:
+        for year in years:
+            try:
+                rounds = indexSchedule(conn, year)
+            except Exception as e:
+                print(f"Could not index the {year} schedule: {e}")
+                continue
+            todo = conn.execute(
+                "SELECT round, code FROM sessions WHERE year = ? AND date_utc <= ? AND (? OR status != 'done') "
+                "ORDER BY round, date_utc", (year, now, force)).fetchall()
+            print(f"{year}: {rounds} events, {len(todo)} sessions to index")
+            for roundNumber, code in todo:
+                indexEntries(conn, year, roundNumber, code)
+    finally:
+        conn.close()
+
+def listYears():
+    """
+    Indexed seasons, newest first. Empty when there is no index.
+    """
+    conn = _connect()
+    if conn is None:
+        return []
+    rows = conn.execute("SELECT DISTINCT year FROM events ORDER BY year DESC").fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+def listEvents(year):
+    """
+    The season's events with the same column names as fastf1.get_event_schedule.
+    Empty when the season isn't indexed.
+    """
+    conn = _connect()
+    if conn is None:
+        return pd.DataFrame(columns=['RoundNumber', 'EventName', 'Country', 'Location', 'EventDate', 'EventFormat'])
+    events = pd.read_sql_query(
+        "SELECT round AS RoundNumber, name AS EventName, country AS Country, location AS Location, "
+        "date AS EventDate, format AS EventFormat FROM events WHERE year = ? ORDER BY round",
+        conn, params=(year,))
+    conn.close()
+    return events
+
+def listEntries(year, grandPrix, sessionType):
+    """
+    Entry list of a session with the same column names as session.results.
+    Empty when the session isn't indexed.
+
+    :param grandPrix (str): event name as in the schedule (e.g. 'Bahrain Grand Prix')
+    :param sessionType (str): 'FP1', 'FP2', 'FP3', 'Q', 'S', 'R'
+    """
+    conn = _connect()
+    if conn is None:
+        return pd.DataFrame(columns=['DriverNumber', 'Abbreviation', 'FullName', 'TeamName', 'TeamColor'])
+    entries = pd.read_sql_query(
+        "SELECT e.number AS DriverNumber, e.abbreviation AS Abbreviation, e.full_name AS FullName, "
+        "e.team AS TeamName, e.team_color AS TeamColor FROM entries e "
+        "JOIN events ev ON ev.year = e.year AND ev.round = e.round "
+        "WHERE e.year = ? AND ev.name = ? AND e.code = ? ORDER BY e.team, e.abbreviation",
+        conn, params=(year, grandPrix, sessionType.upper()))
+    conn.close()
+    return entries
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local index of seasons, events, sessions and entry lists")
+    parser.add_argument("command", choices=["build", "refresh"],
+                        help="build: every season since 2018, refresh: the current season only")
+    parser.add_argument("--years", type=int, nargs="+", help="Seasons to index instead of the default")
+    parser.add_argument("--force", action="store_true", help="Reload entry lists already indexed")
+    args = parser.parse_args()
+
+    years = args.years
+    if years is None and args.command == "refresh":
+        years = [pd.Timestamp.now().year]
+    updateIndex(years, args.force)
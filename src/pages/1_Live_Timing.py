@@ -0,0 +1,81 @@
+import threading
+import streamlit as st
+import plotly.graph_objects as go
+from live import LiveSession, replayMessages, followMessages
+
+st.set_page_config(page_title="F1 Live Timing", layout="wide")
+
+st.title("Live Gap to Reference")
+st.markdown(
+    "**Current-lap gap to the reference driver's last complete lap.** "
+    "*Record a session with `python -m fastf1.livetiming save live.txt`, then follow or replay the file.*"
+)
+
+# sidebar configuration
+with st.sidebar:
+    st.header("Live Configuration")
+    source = st.radio("Source", ["Replay recording", "Follow live recording"])
+    path = st.text_input("Recording file", "live.txt")
+    ref_driver = st.text_input("Reference Driver", "VER").upper()
+    if source == "Replay recording":
+        speed = st.slider("Replay speed", min_value=1, max_value=50, value=10)
+    refresh = st.slider("Refresh every (s)", min_value=0.5, max_value=5.0, value=1.0, step=0.5)
+    start_btn = st.button("Start", type="primary")
+    stop_btn = st.button("Stop")
+
+# the stream runs in a background thread, the page only reads its state
+if (start_btn or stop_btn) and "live_stop" in st.session_state:
+    st.session_state["live_stop"].set()
+if start_btn:
+    stop_event = threading.Event()
+    live = LiveSession(ref_driver)
+    if source == "Replay recording":
+        messages = replayMessages(path, speed)
+    else:
+        messages = followMessages(path, stopEvent=stop_event)
+    threading.Thread(target=live.run, args=(messages, stop_event), daemon=True).start()
+    st.session_state["live"] = live
+    st.session_state["live_stop"] = stop_event
+
+
+@st.fragment(run_every=refresh)
+def live_view():
+    live = st.session_state.get("live")
+    if live is None:
+        st.info("Pick a recording and press Start.")
+        return
+    gaps = live.gaps()
+    if not gaps:
+        st.write("Waiting for a complete reference lap...")
+    else:
+        # one metric per driver, fastest first
+        ordered = sorted(gaps.items(), key=lambda item: item[1])
+        cols = st.columns(min(len(ordered), 10))
+        for i, (driver, gap) in enumerate(ordered[:10]):
+            cols[i].metric(label=driver, value=f"{gap:+.3f}s")
+        fig = go.Figure()
+        for number in live.delta.driverNumbers():
+            distance, delta = live.delta.deltaTrace(number)
+            if len(distance):
+                fig.add_trace(
+                    go.Scattergl(
+                        x=distance, y=delta, mode="lines", name=live.abbreviations.get(number, number)
+                    )
+                )
+        fig.update_layout(
+            template="plotly_dark",
+            height=500,
+            xaxis_title="Distance (m)",
+            yaxis_title="Gap (s)",
+            hovermode="x unified",
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    stats = live.latencyStats()
+    if stats:
+        st.caption(
+            f"{stats['messages']:,} messages, update latency p50 {stats['p50']:.2f} ms, "
+            f"p95 {stats['p95']:.2f} ms, max {stats['max']:.2f} ms"
+        )
+
+
+live_view()
@@ -1,19 +1,36 @@
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import time
+from downsample import downsample
+from profiler import traced
+from channels import DERIVED_CHANNELS, lapChannels
+#plotly takes a good part of a second to import, the functions that draw import it on first use
 
-def plotAnalysis(session, driversData, deltas, refDriver):
+@traced()
+def plotAnalysis(session, driversData, deltas, refDriver, maxPoints=None, webgl=False, channels=()):
     """
     Plots an interactive 5-panel dashboard with Corner Annotations.
+
+    :param driversData (dict): driver -> {'tel': telemetry dataframe or LapTrace, 'color': ...}
+
+    :param maxPoints (int): downsample every trace to this many points with LTTB (None keeps full resolution)
+    :param webgl (bool): render the traces with Scattergl instead of SVG
+    :param channels (list): derived channels (channels.DERIVED_CHANNELS) added as extra panels under the gear,
+        read from the laps' memoized channels so nothing already computed is computed again
     """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    scatter = go.Scattergl if webgl else go.Scatter
     eventName = f"{session.event.EventName} {session.event.year}"
     #the circuits info
     circuit_info = session.get_circuit_info()
+    channels = list(channels)
+    rows = 5 + len(channels)
     fig = make_subplots(
-        rows=5, cols=1, 
+        rows=rows, cols=1, 
         shared_xaxes=True, 
         vertical_spacing=0.02,
-        row_heights=[0.15, 0.40, 0.15, 0.15, 0.15],
-        subplot_titles=("Gap to Reference", "Speed", "Throttle", "Brake", "Gear")
+        row_heights=[0.15, 0.40, 0.15, 0.15, 0.15] + [0.15] * len(channels),
+        subplot_titles=("Gap to Reference", "Speed", "Throttle", "Brake", "Gear",
+                        *(DERIVED_CHANNELS[c]['label'] for c in channels))
     )
     #now adding the driver's trace
     for driver, data in driversData.items():
@@ -22,51 +39,73 @@ def plotAnalysis(session, driversData, deltas, refDriver):
         width = 3 if driver == refDriver else 1.5
         #1st row - the delta
         if driver in deltas:
-            fig.add_trace(go.Scatter(x=deltas[driver]['Distance'], y=deltas[driver]['Delta'], 
+            x, y = downsample(deltas[driver]['Distance'], deltas[driver]['Delta'], maxPoints)
+            fig.add_trace(scatter(x=x, y=y, 
                                    mode='lines', name=f"Gap ({driver})", line=dict(color=color, width=1.5),
                                    legendgroup=driver, showlegend=False,
                                    hovertemplate=f"{driver} Gap: %{{y:.3f}}s<extra></extra>"), row=1, col=1)
 
         #row 2 - speed
-        fig.add_trace(go.Scatter(x=tel['Distance'], y=tel['Speed'], 
+        x, y = downsample(tel['Distance'], tel['Speed'], maxPoints)
+        fig.add_trace(scatter(x=x, y=y, 
                                mode='lines', name=driver, line=dict(color=color, width=width),
                                legendgroup=driver,
                                hovertemplate=f"{driver} Speed: %{{y:.1f}} km/h<extra></extra>"), row=2, col=1)
 
         #row 3 - the throttles
-        fig.add_trace(go.Scatter(x=tel['Distance'], y=tel['Throttle'], 
+        x, y = downsample(tel['Distance'], tel['Throttle'], maxPoints)
+        fig.add_trace(scatter(x=x, y=y, 
                                mode='lines', name=f"Throttle ({driver})", line=dict(color=color, width=1.5),
                                legendgroup=driver, showlegend=False,
                                hovertemplate=f"{driver} Throttle: %{{y:.0f}}%<extra></extra>"), row=3, col=1)
 
         #row 4 - brake
-        fig.add_trace(go.Scatter(x=tel['Distance'], y=tel['Brake'], 
+        x, y = downsample(tel['Distance'], tel['Brake'], maxPoints)
+        fig.add_trace(scatter(x=x, y=y, 
                                mode='lines', name=f"Brake ({driver})", line=dict(color=color, width=1.5),
                                legendgroup=driver, showlegend=False,
                                hovertemplate=f"{driver} Brake: %{{y:.0f}}<extra></extra>"), row=4, col=1)
 
         #tow 5 - Gear
-        fig.add_trace(go.Scatter(x=tel['Distance'], y=tel['nGear'], 
+        x, y = downsample(tel['Distance'], tel['nGear'], maxPoints)
+        fig.add_trace(scatter(x=x, y=y, 
                                mode='lines', name=f"Gear ({driver})", line=dict(color=color, width=1.5),
                                legendgroup=driver, showlegend=False,
                                hovertemplate=f"{driver} Gear: %{{y:.0f}}<extra></extra>"), row=5, col=1)
+
+        #extra rows - derived channels, skipped for laps without the raw channels they need
+        derived = lapChannels(tel)
+        for row, name in enumerate(channels, start=6):
+            if name not in derived:
+                continue
+            x, y = downsample(tel['Distance'], derived[name].astype(float), maxPoints)
+            unit = DERIVED_CHANNELS[name]['unit']
+            fig.add_trace(scatter(x=x, y=y,
+                                   mode='lines', name=f"{name} ({driver})", line=dict(color=color, width=1.5),
+                                   legendgroup=driver, showlegend=False,
+                                   hovertemplate=f"{driver} {name}: %{{y:.2f}} {unit}<extra></extra>"), row=row, col=1)
     #corner animations
+    #all the lines and labels go in with one layout update instead of one relayout per corner
     if circuit_info is not None:
+        shapes = []
+        annotations = list(fig.layout.annotations) #keep the subplot titles
         for index, row in circuit_info.corners.iterrows():
-            #a vertical line for the corner
-            fig.add_vline(x=row['Distance'], line_width=1, line_dash="dash", line_color="gray", opacity=0.5)
+            #a vertical line for the corner, through all the panels
+            shapes.append(dict(type="line", xref=f"x{rows}", yref="paper", x0=row['Distance'], x1=row['Distance'],
+                               y0=0, y1=1, line=dict(width=1, dash="dash", color="gray"), opacity=0.5))
             #we'll place the corner number label at the top of the Speed chart (Row 2)
-            fig.add_annotation(
+            annotations.append(dict(
                 x=row['Distance'], y=350,
+                xref="x2", yref="y2",
                 text=f"{row['Number']}{row['Letter']}",
                 showarrow=False,
-                row=2, col=1,
                 font=dict(size=10, color="gray"),
                 yshift=10
-            )
+            ))
+        fig.update_layout(shapes=shapes, annotations=annotations)
     fig.update_layout(
         template="plotly_dark",
-        height=1000,
+        height=1000 + 200 * len(channels),
         title=dict(text=f"{eventName}: Telemetry Deep Dive", font=dict(size=20)),
         hovermode="x unified",
         legend=dict(traceorder="normal", orientation="h", y=1.02, x=0.5, xanchor="center")
@@ -78,6 +117,60 @@ def plotAnalysis(session, driversData, deltas, refDriver):
     fig.update_yaxes(title_text="Throttle (%)", row=3, col=1, range=[-5, 105])
     fig.update_yaxes(title_text="Brake level", row=4, col=1, tickvals=[0, 1])
     fig.update_yaxes(title_text="Gear", row=5, col=1)
-    fig.update_xaxes(title_text="Distance (m)", row=5, col=1)
+    for row, name in enumerate(channels, start=6):
+        unit = DERIVED_CHANNELS[name]['unit']
+        fig.update_yaxes(title_text=f"{name} ({unit})" if unit else name, row=row, col=1)
+    fig.update_xaxes(title_text="Distance (m)", row=rows, col=1)
+
+    return fig
+
+@traced()
+def plotRaceGaps(gaps, drivers=None, colors=None, toCarAhead=False, maxPoints=None, webgl=False):
+    """
+    Plots the gap of every driver to the leader (or to the car ahead) over the whole race, by lap.
 
-    return fig
\ No newline at end of file
+    :param gaps (RaceGaps): timeline from racegap.getRaceGaps or computeRaceGaps
+    :param drivers (list): driver codes to plot, every driver by default
+    :param colors (dict): driver -> color, plotly's palette by default
+    :param toCarAhead (bool): plot the interval to the car ahead instead of the gap to the leader
+    :param maxPoints (int): downsample every trace to this many points with LTTB (None keeps full resolution)
+    :param webgl (bool): render the traces with Scattergl instead of SVG
+    """
+    import plotly.graph_objects as go
+    scatter = go.Scattergl if webgl else go.Scatter
+    colors = colors or {}
+    fig = go.Figure()
+    for driver in drivers or gaps.drivers:
+        i = gaps.drivers.index(driver)
+        #only this driver's row is read from the memory-mapped arrays
+        laps = gaps.distance[i] / gaps.lapLength
+        x, y = downsample(laps, gaps.interval[i] if toCarAhead else gaps.gap[i], maxPoints)
+        fig.add_trace(scatter(x=x, y=y, mode='lines', name=driver, line=dict(color=colors.get(driver), width=1.5),
+                              hovertemplate=f"{driver} lap %{{x:.1f}}: %{{y:.2f}}s<extra></extra>"))
+    fig.update_layout(
+        title="Interval to the Car Ahead" if toCarAhead else "Gap to the Leader",
+        template="plotly_dark", height=600, hovermode="x unified",
+    )
+    #leader on top, like a timing screen
+    fig.update_yaxes(title_text="Gap (s)", autorange="reversed")
+    fig.update_xaxes(title_text="Lap")
+    return fig
+
+@traced()
+def measureFigure(buildFn, *args, **kwargs):
+    """
+    Builds a figure and reports how heavy it is.
+    Returns the figure and a dict with the build time (s), the JSON payload size (bytes),
+    the number of traces and the total number of points sent to the browser.
+
+    :param buildFn (function): e.g. plotAnalysis or plotTrackMap, called with the other arguments
+    """
+    start = time.perf_counter()
+    fig = buildFn(*args, **kwargs)
+    buildSeconds = time.perf_counter() - start
+    return fig, {
+        'buildSeconds': buildSeconds,
+        'payloadBytes': len(fig.to_json()),
+        'traces': len(fig.data),
+        'points': sum(len(trace.x) for trace in fig.data if trace.x is not None),
+    }
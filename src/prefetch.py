@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telemetry import getPooledSession, getFastestTrace
+
+class Prefetcher:
+    """
+    Loads sessions in the background while the user is still picking them.
+
+    Every client (a Streamlit session) has at most one wanted selection: a new request replaces
+    the previous one, which is cancelled if it hasn't started yet and stops after its current step
+    if it has. Loads go through the session pool, so the Analyze step attaches to a load that is
+    still running instead of starting its own, and a bounded thread pool keeps the server from
+    loading more than a few sessions at once.
+
+    :param maxWorkers (int): sessions loaded at the same time
+    :param settle (float): seconds a selection must stay unchanged before its load starts
+    """
+    def __init__(self, maxWorkers=2, settle=0.5):
+        self.settle = settle
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        self._wanted = {} #client -> (selection, generation)
+        self._futures = {} #client -> future of its current job
+        self._generation = 0
+        self.started = 0
+        self.cancelled = 0
+        self.superseded = 0
+        self.finished = 0
+
+    def request(self, client, year, grandPrix, sessionType, drivers=(), channels=None):
+        """
+        Asks for a session (and the fastest laps of drivers) to be ready soon.
+        Cheap to call on every rerun, the same selection twice is a no-op.
+        """
+        selection = (year, grandPrix, sessionType, tuple(drivers), tuple(channels) if channels else None)
+        with self._lock:
+            current = self._wanted.get(client)
+            if current is not None and current[0] == selection:
+                return
+            self._generation += 1
+            generation = self._generation
+            self._wanted[client] = (selection, generation)
+            previous = self._futures.get(client)
+            if previous is not None and previous.cancel():
+                self.cancelled += 1
+            #clients that finished their prefetch and went away (closed tab) never call forget
+            for other in [c for c, f in self._futures.items() if c != client and f.done()]:
+                del self._futures[other]
+                self._wanted.pop(other, None)
+            self._futures[client] = self._executor.submit(self._run, client, generation, selection)
+
+    def _isCurrent(self, client, generation):
+        with self._lock:
+            wanted = self._wanted.get(client)
+            return wanted is not None and wanted[1] == generation
+
+    def _run(self, client, generation, selection):
+        year, grandPrix, sessionType, drivers, channels = selection
+        #the user is probably still clicking, give the selection a moment to settle
+        time.sleep(self.settle)
+        if not self._isCurrent(client, generation):
+            with self._lock:
+                self.superseded += 1
+            return
+        with self._lock:
+            self.started += 1
+        session = getPooledSession(year, grandPrix, sessionType, drivers=list(drivers),
+                                   channels=list(channels) if channels else None)
+        if session is None:
+            return
+        for driver in drivers:
+            #a newer selection doesn't need these laps, leave the workers to it
+            if not self._isCurrent(client, generation):
+                with self._lock:
+                    self.superseded += 1
+                return
+            getFastestTrace(session, driver)
+        with self._lock:
+            self.finished += 1
+
+    def forget(self, client):
+        """
+        Drops a client's pending request (e.g. once its analysis has started).
+        """
+        with self._lock:
+            self._wanted.pop(client, None)
+            future = self._futures.pop(client, None)
+            if future is not None and future.cancel():
+                self.cancelled += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': sum(not f.done() for f in self._futures.values()),
+                'started': self.started,
+                'finished': self.finished,
+                'cancelled': self.cancelled,
+                'superseded': self.superseded,
+            }
+
+prefetcher = Prefetcher(maxWorkers=int(os.environ.get('F1_PREFETCH_WORKERS', 2)))
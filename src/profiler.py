@@ -0,0 +1,181 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+#profiler of the current run, None when profiling is off
+#a context variable so two Streamlit sessions profiling at the same time don't mix their spans
+_current = contextvars.ContextVar('profiler', default=None)
+_NULL_SPAN = contextlib.nullcontext()
+
+def currentRss():
+    """
+    Resident memory of this process in bytes, None if it can't be read.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+class Profiler:
+    """
+    Collects timing spans of one pipeline run: wall time, CPU time of the thread and
+    resident memory change for every stage, with details such as the driver.
+
+    Usage:
+        with Profiler() as profiler:
+            ...
+        print(profiler.report())
+    """
+    def __init__(self):
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._token = None
+
+    def start(self):
+        """
+        Makes this the active profiler of the current context. Returns self.
+        """
+        self._token = _current.set(self)
+        return self
+
+    def stop(self):
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @contextlib.contextmanager
+    def span(self, name, **details):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        rss = currentRss()
+        cpu = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.thread_time() - cpu
+            rssAfter = currentRss()
+            self._local.depth = depth
+            with self._lock:
+                self.spans.append({
+                    'name': name,
+                    'details': {k: str(v) for k, v in details.items()},
+                    'start': start - self._origin,
+                    'wall': wall,
+                    'cpu': cpu,
+                    'rssDelta': rssAfter - rss if rss is not None and rssAfter is not None else None,
+                    'thread': threading.get_ident(),
+                    'depth': depth,
+                })
+
+    def table(self):
+        """
+        Every span as a row, in start order, times in seconds and memory in MB.
+        """
+        rows = [{
+            'Stage': ' ' * 2 * s['depth'] + s['name'],
+            'Details': ', '.join(f"{k}={v}" for k, v in s['details'].items()),
+            'Wall (s)': s['wall'],
+            'CPU (s)': s['cpu'],
+            'Memory (MB)': s['rssDelta'] / 1024**2 if s['rssDelta'] is not None else None,
+        } for s in sorted(self.spans, key=lambda s: s['start'])]
+        return pd.DataFrame(rows, columns=['Stage', 'Details', 'Wall (s)', 'CPU (s)', 'Memory (MB)'])
+
+    def summary(self):
+        """
+        Totals per stage: call count, wall and CPU time, memory change.
+        """
+        if not self.spans:
+            return pd.DataFrame(columns=['Stage', 'Calls', 'Wall (s)', 'CPU (s)', 'Memory (MB)'])
+        df = pd.DataFrame(self.spans)
+        df['rssDelta'] = df['rssDelta'].astype(float) / 1024**2
+        out = df.groupby('name', sort=False).agg(
+            Calls=('wall', 'size'), Wall=('wall', 'sum'), CPU=('cpu', 'sum'), Memory=('rssDelta', 'sum'))
+        out = out.rename(columns={'Wall': 'Wall (s)', 'CPU': 'CPU (s)', 'Memory': 'Memory (MB)'})
+        return out.sort_values('Wall (s)', ascending=False).rename_axis('Stage').reset_index()
+
+    def report(self):
+        """
+        The span tree as text, for the terminal.
+        """
+        lines = [f"{'stage':<40} {'wall':>9} {'cpu':>9} {'mem':>9}"]
+        for row in self.table().itertuples(index=False):
+            label = row.Stage + (f" [{row.Details}]" if row.Details else '')
+            memory = f"{row[4]:+.1f}MB" if pd.notna(row[4]) else '-'
+            lines.append(f"{label:<40} {row[2]:>8.3f}s {row[3]:>8.3f}s {memory:>9}")
+        return '\n'.join(lines)
+
+    def chromeTrace(self):
+        """
+        The spans in Chrome trace event format, for chrome://tracing, Perfetto or speedscope.
+        """
+        pid = os.getpid()
+        events = [{
+            'name': s['name'],
+            'cat': 'pipeline',
+            'ph': 'X',
+            'ts': s['start'] * 1e6,
+            'dur': s['wall'] * 1e6,
+            'pid': pid,
+            'tid': s['thread'],
+            'args': {**s['details'], 'cpuSeconds': s['cpu'], 'rssDeltaBytes': s['rssDelta']},
+        } for s in self.spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def saveChromeTrace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chromeTrace(), f)
+
+def activeProfiler():
+    return _current.get()
+
+def span(name, **details):
+    """
+    Times a block under the active profiler, does nothing when profiling is off.
+    """
+    profiler = _current.get()
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name, **details)
+
+def traced(name=None, details=()):
+    """
+    Decorator timing every call of a function under the active profiler.
+    When profiling is off the only cost is one context variable lookup.
+
+    :param name (str): span name, the function name by default
+    :param details (tuple): argument names recorded with the span (e.g. ('driverCode',))
+    """
+    def decorate(fn):
+        label = name or fn.__name__
+        signature = inspect.signature(fn) if details else None
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _current.get()
+            if profiler is None:
+                return fn(*args, **kwargs)
+            values = {}
+            if signature is not None:
+                bound = signature.bind_partial(*args, **kwargs).arguments
+                values = {k: bound[k] for k in details if k in bound}
+            with profiler.span(label, **values):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,229 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from analysis import _interpStacked
+from profiler import traced
+from telemetry import loadSession, stackLaps
+
+#bump this whenever the on-disk layout changes, old timelines are then ignored and rebuilt
+GAPS_VERSION = 1
+gaps_dir = 'race_gaps'
+#arrays stored one .npy file each, so every one of them can be memory-mapped on its own
+_ARRAYS = ('time', 'distance', 'gap', 'interval', 'position')
+
+class RaceGaps:
+    """
+    Every car's race on one session time grid, as (drivers x time) arrays:
+    - distance: race distance covered (m), laps are counted from LapNumber so every lap is worth one lap length
+    - gap: gap to the leader (s), the time since the leader passed the same race distance
+    - interval: gap to the car ahead (s), 0 for the leader
+    - position: running position, 1 for the leader (int8)
+    A car that retired or finished keeps its last distance and gap.
+    Loaded from disk, the arrays are memory-mapped and only the parts a query touches are read.
+    """
+    def __init__(self, drivers, time, distance, gap, interval, position, lapLength, lastTime):
+        self.drivers = list(drivers)
+        self.time = time #session time of the grid in seconds
+        self.distance = distance
+        self.gap = gap
+        self.interval = interval
+        self.position = position
+        self.lapLength = lapLength
+        self.lastTime = lastTime #session time of each driver's last sample
+
+    def _index(self, t):
+        #grid index at or just before a session time in seconds
+        return int(np.clip(np.searchsorted(self.time, t, side='right') - 1, 0, len(self.time) - 1))
+
+    def gapSeries(self, driver, toCarAhead=False):
+        """
+        Gap of one driver over the whole race as a dataframe with 'SessionTime' (s), 'Lap' and 'Gap'.
+        """
+        i = self.drivers.index(driver)
+        return pd.DataFrame({
+            'SessionTime': self.time,
+            'Lap': self.distance[i] / self.lapLength,
+            'Gap': self.interval[i] if toCarAhead else self.gap[i],
+        })
+
+    def standings(self, t):
+        """
+        Running order at a session time in seconds.
+        Returns a dataframe with 'Position', 'Driver', 'Lap', 'Gap' and 'Interval', leader first.
+        """
+        k = self._index(t)
+        order = np.argsort(self.position[:, k])
+        return pd.DataFrame({
+            'Position': self.position[order, k],
+            'Driver': np.asarray(self.drivers, dtype=object)[order],
+            'Lap': self.distance[order, k] / self.lapLength,
+            'Gap': self.gap[order, k],
+            'Interval': self.interval[order, k],
+        })
+
+    def positionChanges(self, driver=None, start=None, end=None):
+        """
+        Every change of running position, optionally for one driver and between two session times.
+        Returns a dataframe with 'SessionTime', 'Lap', 'Driver', 'From' and 'To'.
+        """
+        lo = 0 if start is None else self._index(start)
+        hi = len(self.time) if end is None else self._index(end) + 1
+        rows = slice(None) if driver is None else [self.drivers.index(driver)]
+        position = np.asarray(self.position[rows, lo:hi])
+        #one vectorized diff over the window, then only the changes are looked at
+        changed = np.nonzero(position[:, 1:] != position[:, :-1])
+        d, k = changed[0], changed[1] + 1
+        drivers = np.asarray(self.drivers, dtype=object)[rows]
+        changes = pd.DataFrame({
+            'SessionTime': self.time[lo + k],
+            'Lap': self.distance[np.arange(len(self.drivers))[rows][d], lo + k] / self.lapLength,
+            'Driver': drivers[d],
+            'From': position[d, k - 1],
+            'To': position[d, k],
+        })
+        return changes.sort_values(['SessionTime', 'To'], ignore_index=True)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def save(self, path):
+        """
+        Writes the timeline to a directory: one uncompressed .npy file per array and meta.json.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'version': GAPS_VERSION, 'drivers': self.drivers, 'lapLength': self.lapLength,
+                       'lastTime': self.lastTime.tolist()}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Reads a timeline written by save, memory-mapped by default.
+        Returns None if there is none or it was written by another version.
+        """
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != GAPS_VERSION:
+            return None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+                  for name in _ARRAYS}
+        return cls(meta['drivers'], lapLength=meta['lapLength'], lastTime=np.asarray(meta['lastTime']), **arrays)
+
+    def __repr__(self):
+        return f"RaceGaps({len(self.drivers)} drivers, {len(self.time)} steps, {self.nbytes} bytes)"
+
+@traced(details=('step',))
+def computeRaceGaps(session, drivers=None, step=0.5):
+    """
+    Builds the race gap timeline of every car (or some of them) from the lap telemetry.
+
+    Each car's race distance is its lap count plus the fraction of the current lap covered, times the
+    median lap length, so the small speed-integration drift of every lap doesn't add up over the race.
+    All cars are then interpolated onto one time grid in a single np.interp call, and the gap to the
+    leader is read off the leader's distance curve inverted in another single call.
+    Returns None if there is no telemetry.
+
+    :param session (Session): a race session loaded with laps and telemetry
+    :param drivers (list): driver codes, every driver by default
+    :param step (float): grid spacing in seconds
+    """
+    data = stackLaps(session, drivers, channels=[])
+    if data is None:
+        return None
+    lapId = data['LapId']
+    starts = np.flatnonzero(np.r_[True, lapId[1:] != lapId[:-1]])
+    lapOfSample = np.cumsum(np.r_[True, lapId[1:] != lapId[:-1]]) - 1
+    lapDistance = np.maximum.reduceat(data['Distance'], starts)
+    lapLength = float(np.median(lapDistance))
+    fraction = np.clip(data['Distance'] / np.maximum(lapDistance[lapOfSample], 1.0), 0.0, 1.0)
+    raceDistance = (data['LapNumber'].astype(np.float64) - 1 + fraction) * lapLength
+
+    #samples are sorted by driver, then time within each driver
+    driverCodes = data['Driver']
+    bounds = np.flatnonzero(np.r_[True, driverCodes[1:] != driverCodes[:-1], True])
+    codes = [driverCodes[b] for b in bounds[:-1]]
+    times = [data['SessionTime'][a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    distances = [np.maximum.accumulate(raceDistance[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    grid = np.arange(min(t[0] for t in times), max(t[-1] for t in times) + step, step)
+    lastTime = np.array([t[-1] for t in times])
+
+    distance = _interpStacked(grid, times, distances)
+    #the leader's distance over time only ever goes up, so it can be inverted with np.interp:
+    #the time the leader reached every car's current distance
+    leader = np.maximum.accumulate(distance.max(axis=0))
+    leaderTime = np.interp(distance.ravel(), leader, grid).reshape(distance.shape)
+    #once a car stopped (finished or retired) its gap stays what it was at its last sample
+    arrival = np.minimum(grid[np.newaxis, :], lastTime[:, np.newaxis])
+    gap = np.maximum(arrival - leaderTime, 0.0)
+
+    #running order: furthest first, the one who got there first on equal distance (after the flag)
+    order = np.lexsort((arrival, -distance), axis=0)
+    position = np.empty(distance.shape, dtype=np.int8)
+    np.put_along_axis(position, order, np.arange(1, len(codes) + 1, dtype=np.int8)[:, np.newaxis], axis=0)
+    #interval: gap difference to the car one place ahead
+    sortedGap = np.take_along_axis(gap, order, axis=0)
+    sortedInterval = np.diff(sortedGap, axis=0, prepend=sortedGap[:1])
+    interval = np.empty_like(gap)
+    np.put_along_axis(interval, order, sortedInterval, axis=0)
+
+    return RaceGaps(codes, grid, distance.astype(np.float32), gap.astype(np.float32),
+                    interval.astype(np.float32), position, lapLength, lastTime)
+
+def gapsPath(year, grandPrix, sessionType):
+    """
+    Returns the timeline directory for a (year, GP, session) key.
+    """
+    key = f"{year}_{grandPrix}_{sessionType}".lower().replace(' ', '_')
+    return os.path.join(gaps_dir, key)
+
+def getRaceGaps(year, grandPrix, sessionType='R', step=0.5, rebuild=False):
+    """
+    The race gap timeline of a session, memory-mapped from disk, built and written first if needed.
+    Returns None if the session can't be loaded.
+    """
+    path = gapsPath(year, grandPrix, sessionType)
+    if not rebuild:
+        gaps = RaceGaps.load(path)
+        if gaps is not None:
+            return gaps
+    session = loadSession(year, grandPrix, sessionType)
+    if session is None:
+        return None
+    gaps = computeRaceGaps(session, step=step)
+    if gaps is None:
+        print(f"No telemetry for {year} {grandPrix} ({sessionType}).")
+        return None
+    gaps.save(path)
+    return RaceGaps.load(path)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Gap of every car to the leader over a whole race")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--gp", required=True, help="Grand Prix name, e.g. 'Bahrain'")
+    parser.add_argument("--session", default="R", help="R or S")
+    parser.add_argument("--step", type=float, default=0.5, help="Time grid spacing in seconds")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the timeline even if it is on disk")
+    parser.add_argument("--lap", type=float, help="Print the running order when the leader starts this lap")
+    parser.add_argument("--changes", metavar="DRIVER", nargs="?", const="",
+                        help="Print the position changes (of one driver, every driver without a code)")
+    args = parser.parse_args()
+
+    gaps = getRaceGaps(args.year, args.gp, args.session, args.step, args.rebuild)
+    if gaps is not None:
+        print(gaps)
+        if args.lap is not None:
+            leader = gaps.distance.max(axis=0)
+            k = min(np.searchsorted(leader, (args.lap - 1) * gaps.lapLength), len(gaps.time) - 1)
+            print(gaps.standings(gaps.time[k]).to_string(index=False))
+        if args.changes is not None:
+            print(gaps.positionChanges(args.changes.upper() or None).to_string(index=False))
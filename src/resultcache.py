@@ -0,0 +1,315 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis import computeDeltaMatrix
+from centerline import getCenterline, alignTrace
+from plotter import plotAnalysis
+from profiler import traced
+from laptrace import LapTrace
+from telemetry import loadSession, getFastestLap
+from track import plotDominanceMap, plotTrackMap
+
+cache_dir = 'derived_cache'
+#the modules whose code decides what the cached results look like, any edit invalidates the cache
+_CODE_FILES = ('analysis.py', 'plotter.py', 'track.py', 'downsample.py', 'laptrace.py', 'centerline.py', 'channels.py',
+               'resultcache.py')
+_codeVersion = None
+
+def codeVersion():
+    """
+    Hash of the analysis and plotting code (and the FastF1 version).
+    """
+    global _codeVersion
+    if _codeVersion is None:
+        import fastf1
+        digest = hashlib.sha256(fastf1.__version__.encode())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in _CODE_FILES:
+            with open(os.path.join(here, name), 'rb') as f:
+                digest.update(f.read())
+        _codeVersion = digest.hexdigest()[:16]
+    return _codeVersion
+
+def cacheKey(kind, sessionKey, drivers, refDriver=None, params=None):
+    """
+    Content address of a derived result: a hash of what it is, the session, the drivers (in order),
+    the reference driver, the analysis parameters and the code version.
+    """
+    payload = json.dumps({
+        'kind': kind,
+        'session': list(sessionKey),
+        'drivers': list(drivers),
+        'ref': refDriver,
+        'params': params or {},
+        'code': codeVersion(),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ResultCache:
+    """
+    Disk cache of derived results (delta arrays, figure JSON) addressed by cacheKey.
+    Files are touched on every hit, so the oldest modification time is the least recently used,
+    and the oldest files are deleted once the total size goes over the budget.
+
+    :param directory (str): where the files go
+    :param maxBytes (int): size budget of the whole directory
+    """
+    def __init__(self, directory=None, maxBytes=1024**3):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self._lock = threading.Lock()
+        self._bytes = None #total size, scanned on first use
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _root(self):
+        return self.directory or cache_dir
+
+    def _path(self, key, ext):
+        #two-level layout so a big cache doesn't put every file in one directory
+        return os.path.join(self._root(), key[:2], f"{key}.{ext}")
+
+    def _files(self):
+        for dirpath, _, filenames in os.walk(self._root()):
+            for name in filenames:
+                if not name.endswith('.tmp'):
+                    yield os.path.join(dirpath, name)
+
+    def _size(self):
+        if self._bytes is None:
+            self._bytes = sum(os.path.getsize(p) for p in self._files())
+        return self._bytes
+
+    def get(self, key, ext):
+        """
+        Returns the cached bytes, None on a miss.
+        """
+        path = self._path(key, ext)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, ext, data):
+        path = self._path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        #written aside then renamed, readers never see half a file
+        tmpPath = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmpPath, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            #sized before the rename: the first scan must not see the new file, an overwrite only adds the difference
+            total = self._size()
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            os.replace(tmpPath, path)
+            self.writes += 1
+            self._bytes = total + len(data) - previous
+            if self._bytes > self.maxBytes:
+                self._evict()
+
+    def _evict(self):
+        files = []
+        for path in self._files():
+            try:
+                st = os.stat(path)
+                files.append((st.st_mtime, st.st_size, path))
+            except OSError:
+                pass
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        #down to 90% of the budget so we don't evict again on the next write
+        for _, size, path in files[:-1]:
+            if total <= 0.9 * self.maxBytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        self._bytes = total
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._files()):
+                os.remove(path)
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns the cache counters, hit rate and current size.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'bytes': self._size(),
+            }
+
+resultCache = ResultCache(maxBytes=int(os.environ.get('F1_RESULT_CACHE_BYTES', 1024**3)))
+
+@traced()
+def cachedDeltaMatrix(sessionKey, drivers, telemetries, step=1.0, aligned=False):
+    """
+    computeDeltaMatrix through the result cache.
+
+    :param sessionKey (tuple): (year, grandPrix, sessionType)
+    :param drivers (list): driver codes, in the same order as telemetries
+    :param aligned (bool): the telemetries went through centerline.alignTrace, part of the key
+    """
+    key = cacheKey('deltaMatrix', sessionKey, drivers, params={'step': step, 'aligned': aligned})
+    data = resultCache.get(key, 'npz')
+    if data is not None:
+        arrays = np.load(io.BytesIO(data))
+        return arrays['distance'], arrays['timeGrid'], arrays['deltas']
+    distance, timeGrid, deltas = computeDeltaMatrix(telemetries, step)
+    buffer = io.BytesIO()
+    np.savez(buffer, distance=distance, timeGrid=timeGrid, deltas=deltas)
+    resultCache.put(key, 'npz', buffer.getvalue())
+    return distance, timeGrid, deltas
+
+def _pointCount(trace):
+    #figures read back from JSON keep numpy arrays as base64 typed arrays, which plotly.js reads as is
+    x = trace.x
+    if x is None:
+        return 0
+    if isinstance(x, dict) and 'bdata' in x:
+        return len(base64.b64decode(x['bdata'])) // np.dtype(x['dtype']).itemsize
+    return len(x)
+
+@traced()
+def cachedFigure(kind, sessionKey, drivers, refDriver, params, buildFn, *args, **kwargs):
+    """
+    Builds a figure through the result cache, storing its JSON.
+    Returns the figure and the same stats as plotter.measureFigure plus 'cached'
+    (buildSeconds includes writing the cache on a miss, it is the load time on a hit).
+
+    :param kind (str): figure name, part of the key
+    :param params (dict): everything besides the session and drivers the figure depends on (colors, options)
+    :param buildFn (function): e.g. plotAnalysis, called with the other arguments on a miss
+    """
+    key = cacheKey(kind, sessionKey, drivers, refDriver, params)
+    start = time.perf_counter()
+    data = resultCache.get(key, 'json')
+    cached = data is not None
+    if cached:
+        import plotly.io as pio
+        fig = pio.from_json(data.decode('utf-8'), skip_invalid=True)
+    else:
+        fig = buildFn(*args, **kwargs)
+        #serialized once, for the cache and the payload size
+        data = fig.to_json().encode('utf-8')
+        resultCache.put(key, 'json', data)
+    return fig, {
+        'buildSeconds': time.perf_counter() - start,
+        'payloadBytes': len(data),
+        'traces': len(fig.data),
+        'points': sum(_pointCount(trace) for trace in fig.data),
+        'cached': cached,
+    }
+
+def analysisParams(maxPoints, webgl, colors, aligned, channels):
+    """
+    Cache params of the main analysis figure, shared by the dashboard and warmSession so their keys match.
+    """
+    return {'maxPoints': maxPoints, 'webgl': webgl, 'colors': colors, 'aligned': aligned, 'channels': list(channels or [])}
+
+def warmSession(year, grandPrix, sessionType, drivers=None, refDriver=None, maxPoints=1500, webgl=True, nSectors=100,
+                aligned=False, channels=None):
+    """
+    Computes and caches what the dashboard shows for one session and driver selection,
+    with the dashboard's default options (fast rendering, 100 minisectors, laps not aligned, no extra channels).
+    The app's default selection is the first two drivers in alphabetical order.
+    """
+    import fastf1.plotting
+    session = loadSession(year, grandPrix, sessionType, drivers=drivers)
+    if session is None:
+        return False
+    if drivers is None:
+        drivers = sorted(session.results['Abbreviation'].dropna().unique().tolist())[:2]
+    refDriver = refDriver or drivers[0]
+    sessionKey = (year, grandPrix, sessionType)
+    line = getCenterline(session) if aligned else None
+    aligned = line is not None
+
+    driversData = {}
+    for driver in drivers:
+        lap, tel = getFastestLap(session, driver)
+        if tel is not None:
+            trace = LapTrace.fromLap(lap, tel)
+            driversData[driver] = {'tel': alignTrace(trace, line) if aligned else trace, 'lapTime': lap['LapTime'],
+                                   'color': fastf1.plotting.get_driver_color(driver, session=session)}
+    if refDriver not in driversData:
+        print(f"No lap for the reference driver {refDriver}, nothing cached.")
+        return False
+    loaded = list(driversData)
+    colors = {d: driversData[d]['color'] for d in loaded}
+
+    distance, _, deltaMatrix = cachedDeltaMatrix(sessionKey, loaded, [driversData[d]['tel'] for d in loaded],
+                                                 aligned=aligned)
+    refIdx = loaded.index(refDriver)
+    deltas = {d: pd.DataFrame({'Distance': distance, 'Delta': deltaMatrix[refIdx, i]})
+              for i, d in enumerate(loaded) if d != refDriver}
+
+    mapDrivers = sorted(loaded, key=lambda d: d != refDriver)
+    if len(mapDrivers) > 1:
+        cachedFigure('dominanceMap', sessionKey, mapDrivers, refDriver, {'nSectors': nSectors, 'colors': colors, 'aligned': aligned},
+                     plotDominanceMap, session, mapDrivers, [driversData[d]['tel'] for d in mapDrivers],
+                     colors, nSectors)
+    else:
+        cachedFigure('trackMap', sessionKey, mapDrivers, refDriver, {'aligned': aligned},
+                     plotTrackMap, session, refDriver, driversData[refDriver]['tel'])
+    cachedFigure('analysis', sessionKey, loaded, refDriver,
+                 analysisParams(maxPoints, webgl, colors, aligned, channels),
+                 plotAnalysis, session, driversData, deltas, refDriver, maxPoints=maxPoints, webgl=webgl,
+                 channels=channels or [])
+    return True
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Cache of derived results and figures")
+    parser.add_argument("command", choices=["warm", "stats", "clear"])
+    parser.add_argument("--sessions", nargs="+", default=[],
+                        help="Sessions to warm as YEAR:GRAND PRIX:SESSION, e.g. '2024:Bahrain Grand Prix:Q'")
+    parser.add_argument("--drivers", nargs="+", help="Driver codes, the first one is the reference")
+    parser.add_argument("--minisectors", type=int, default=100, help="Minisectors of the dominance map")
+    parser.add_argument("--aligned", action="store_true", help="Align the laps on the circuit's centerline")
+    parser.add_argument("--channels", nargs="+", default=[], help="Extra channel panels of the analysis figure")
+    args = parser.parse_args()
+
+    if args.command == "warm":
+        drivers = [d.upper() for d in args.drivers] if args.drivers else None
+        for spec in args.sessions:
+            year, grandPrix, sessionType = spec.split(':')
+            ok = warmSession(int(year), grandPrix, sessionType, drivers, nSectors=args.minisectors, aligned=args.aligned,
+                             channels=args.channels)
+            print(f"{spec}: {'cached' if ok else 'failed'}")
+    elif args.command == "clear":
+        resultCache.clear()
+    stats = resultCache.stats()
+    print(f"Result cache: {stats['bytes'] / 1024**2:.1f} MB, {stats['hits']} hits / {stats['misses']} misses, "
+          f"{stats['writes']} writes, {stats['evictions']} evictions")
@@ -0,0 +1,275 @@
+import json
+import os
+import shutil
+
+import fastf1
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from fastf1.core import Laps, Session, SessionResults, Telemetry
+from fastf1.events import Event
+from fastf1.mvapi import CircuitInfo
+
+#bump this whenever the on-disk layout changes, old snapshots are then ignored and rebuilt
+SNAPSHOT_VERSION = 1
+snapshot_dir = 'snapshots'
+
+#session level tables we keep, attribute name -> file name
+_TABLES = {
+    '_laps': 'laps',
+    '_results': 'results',
+    '_track_status': 'track_status',
+    '_session_status': 'session_status',
+    '_race_control_messages': 'race_control_messages',
+    '_weather_data': 'weather_data',
+}
+
+class SnapshotSession(Session):
+    """
+    A regular FastF1 session rebuilt from a snapshot.
+    Everything downstream (laps, telemetry, corners) works without touching the API.
+    """
+    def __init__(self, event, sessionName, circuitInfo=None):
+        super().__init__(event, sessionName, f1_api_support=True)
+        self._circuitInfo = circuitInfo
+
+    def get_circuit_info(self):
+        #the corners were already placed on the lap distance when the snapshot was written
+        if self._circuitInfo is not None:
+            return self._circuitInfo
+        return super().get_circuit_info()
+
+    def load(self, **kwargs):
+        #the data is already there, nothing to load
+        pass
+
+def snapshotPath(year, grandPrix, sessionType):
+    """
+    Returns the snapshot directory for a (year, GP, session) key.
+    """
+    key = f"{year}_{grandPrix}_{sessionType}".lower().replace(' ', '_')
+    return os.path.join(snapshot_dir, key)
+
+def _writeTable(df, path):
+    #uncompressed so the file can be memory-mapped on load
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    feather.write_feather(table, path, compression='uncompressed')
+
+def _readTable(path):
+    return feather.read_table(path, memory_map=True)
+
+def _toJson(value):
+    #timestamps keep their utc offset so the api path of the session stays the same
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return {'__type__': type(value).__name__, 'value': value.isoformat()}
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and pd.isnull(value):
+        return None
+    return value
+
+def _fromJson(value):
+    if isinstance(value, dict) and '__type__' in value:
+        if value['__type__'] == 'Timestamp':
+            return pd.Timestamp(value['value'])
+        return pd.Timedelta(value['value'])
+    return value
+
+def _writeTelemetry(data, path):
+    """
+    Stacks the per-driver telemetry into one table and returns the row offsets of each driver.
+    """
+    offsets = {}
+    frames = []
+    start = 0
+    for driver, tel in data.items():
+        offsets[driver] = [start, len(tel)]
+        frames.append(pd.DataFrame(tel))
+        start += len(tel)
+    if frames:
+        stacked = pd.concat(frames, ignore_index=True)
+        feather.write_feather(stacked, path, compression='uncompressed')
+    return offsets
+
+def _readTelemetry(path, offsets, session):
+    data = {}
+    if not offsets:
+        return data
+    table = _readTable(path)
+    for driver, (start, length) in offsets.items():
+        #slicing an arrow table is zero-copy, only to_pandas materializes the driver
+        df = table.slice(start, length).to_pandas()
+        data[driver] = Telemetry(df, session=session, driver=driver)
+    return data
+
+def writeSnapshot(session, year, grandPrix, sessionType):
+    """
+    Writes a fully loaded session to disk so later loads can skip FastF1 parsing.
+
+    :param session (Session): a session loaded with laps and telemetry
+    :param year (int): the racing season (e.g, 2024)
+    :param grandPrix (str): the GP name, as passed to loadSession
+    :param sessionType (str): 'FP1', 'FP2', 'FP3', 'Q', 'S', 'R'
+    """
+    path = snapshotPath(year, grandPrix, sessionType)
+    tmpPath = path + '.tmp'
+    if os.path.exists(tmpPath):
+        shutil.rmtree(tmpPath)
+    os.makedirs(tmpPath)
+
+    tables = []
+    for attr, name in _TABLES.items():
+        df = getattr(session, attr, None)
+        if df is not None:
+            _writeTable(pd.DataFrame(df), os.path.join(tmpPath, f"{name}.arrow"))
+            tables.append(attr)
+
+    carOffsets = _writeTelemetry(session.car_data, os.path.join(tmpPath, 'car_data.arrow'))
+    posOffsets = _writeTelemetry(session.pos_data, os.path.join(tmpPath, 'pos_data.arrow'))
+
+    #the corners need telemetry to get their distance, so we store them already computed
+    rotation = None
+    try:
+        circuitInfo = session.get_circuit_info()
+    except Exception as e:
+        print(f"Could not store corner info: {e}")
+        circuitInfo = None
+    if circuitInfo is not None:
+        rotation = float(circuitInfo.rotation)
+        for name in ('corners', 'marshal_lights', 'marshal_sectors'):
+            _writeTable(getattr(circuitInfo, name), os.path.join(tmpPath, f"{name}.arrow"))
+
+    splitTimes = getattr(session, '_session_split_times', None)
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'fastf1': fastf1.__version__,
+        'year': int(session.event.year),
+        'event': {k: _toJson(v) for k, v in session.event.items()},
+        'name': session.name,
+        'tables': tables,
+        'car_data': carOffsets,
+        'pos_data': posOffsets,
+        'rotation': rotation,
+        't0_date': _toJson(getattr(session, '_t0_date', None)),
+        'session_start_time': _toJson(getattr(session, '_session_start_time', None)),
+        'total_laps': _toJson(getattr(session, '_total_laps', None)),
+        'session_split_times': [_toJson(t) for t in splitTimes] if splitTimes else None,
+        #only kept for reference, the values are stringified
+        'session_info': json.loads(json.dumps(getattr(session, '_session_info', {}), default=str)),
+    }
+    with open(os.path.join(tmpPath, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    #swap the finished snapshot in, a reader never sees a half written one
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmpPath, path)
+    print(f"Snapshot written to {path}")
+
+def loadSnapshot(year, grandPrix, sessionType):
+    """
+    Loads a session from its snapshot, returns None if there is no valid snapshot.
+
+    :param year (int): the racing season (e.g, 2024)
+    :param grandPrix (str): the GP name, as passed to loadSession
+    :param sessionType (str): 'FP1', 'FP2', 'FP3', 'Q', 'S', 'R'
+    """
+    return loadSnapshotFrom(snapshotPath(year, grandPrix, sessionType))
+
+def loadSnapshotFrom(path):
+    """
+    Loads the snapshot stored in a directory, returns None if it is missing or outdated.
+    """
+    metaPath = os.path.join(path, 'meta.json')
+    if not os.path.exists(metaPath):
+        return None
+    with open(metaPath) as f:
+        meta = json.load(f)
+    #a snapshot written by another layout or another FastF1 version could differ from a fresh load
+    if meta.get('version') != SNAPSHOT_VERSION or meta.get('fastf1') != fastf1.__version__:
+        print(f"Snapshot {path} is outdated, ignoring it.")
+        return None
+
+    event = Event({k: _fromJson(v) for k, v in meta['event'].items()}, year=meta['year'])
+    circuitInfo = None
+    if meta['rotation'] is not None:
+        markers = {
+            name: _readTable(os.path.join(path, f"{name}.arrow")).to_pandas()
+            for name in ('corners', 'marshal_lights', 'marshal_sectors')
+        }
+        circuitInfo = CircuitInfo(rotation=meta['rotation'], **markers)
+    session = SnapshotSession(event, meta['name'], circuitInfo)
+
+    for attr in meta['tables']:
+        df = _readTable(os.path.join(path, f"{_TABLES[attr]}.arrow")).to_pandas()
+        if attr == '_laps':
+            df = Laps(df, session=session)
+        elif attr == '_results':
+            df = SessionResults(df)
+        setattr(session, attr, df)
+
+    session._car_data = _readTelemetry(os.path.join(path, 'car_data.arrow'), meta['car_data'], session)
+    session._pos_data = _readTelemetry(os.path.join(path, 'pos_data.arrow'), meta['pos_data'], session)
+    session._t0_date = _fromJson(meta['t0_date'])
+    session._session_start_time = _fromJson(meta['session_start_time'])
+    session._total_laps = meta['total_laps']
+    if meta['session_split_times']:
+        session._session_split_times = [_fromJson(t) for t in meta['session_split_times']]
+    session._session_info = meta['session_info']
+    return session
+
+def invalidateSnapshot(year, grandPrix, sessionType):
+    """
+    Deletes the snapshot of a session, the next load goes through FastF1 again.
+    """
+    path = snapshotPath(year, grandPrix, sessionType)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+def verifySnapshot(session, snapshot, drivers=None):
+    """
+    Checks that a snapshot gives the same laps and fastest-lap telemetry as the FastF1 session.
+    Returns the list of mismatches (empty if everything matches).
+
+    :param session (Session): the session loaded through FastF1
+    :param snapshot (SnapshotSession): the same session loaded from its snapshot
+    :param drivers (list): driver codes to check, all drivers by default
+    """
+    mismatches = []
+    try:
+        pd.testing.assert_frame_equal(pd.DataFrame(session.laps), pd.DataFrame(snapshot.laps))
+    except AssertionError as e:
+        mismatches.append(f"laps: {e}")
+    if drivers is None:
+        drivers = session.laps['Driver'].dropna().unique().tolist()
+    for driver in drivers:
+        try:
+            expected = session.laps.pick_drivers(driver).pick_fastest().get_telemetry()
+            actual = snapshot.laps.pick_drivers(driver).pick_fastest().get_telemetry()
+            pd.testing.assert_frame_equal(pd.DataFrame(expected), pd.DataFrame(actual))
+        except Exception as e:
+            mismatches.append(f"{driver}: {e}")
+    return mismatches
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check a session snapshot against FastF1")
+    parser.add_argument("--year", type=int, required=True, help="Year of the race")
+    parser.add_argument("--race", type=str, required=True, help="Name of the Grand Prix")
+    parser.add_argument("--session", type=str, default="Q", help="Session type")
+    args = parser.parse_args()
+
+    from telemetry import initCache
+    initCache()
+    fresh = fastf1.get_session(args.year, args.race, args.session)
+    fresh.load()
+    stored = loadSnapshot(args.year, args.race, args.session)
+    if stored is None:
+        writeSnapshot(fresh, args.year, args.race, args.session)
+        stored = loadSnapshot(args.year, args.race, args.session)
+    problems = verifySnapshot(fresh, stored)
+    for problem in problems:
+        print(problem)
+    print("Snapshot matches FastF1." if not problems else f"{len(problems)} mismatches found.")
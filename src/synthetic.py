@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from fastf1.core import Laps, Session, SessionResults, Telemetry
+from fastf1.events import Event
+from fastf1.mvapi import CircuitInfo
+
+#rough numbers of a real session, used to size the generated data
+BASE_LAP_TIME = 92.0
+CAR_DATA_HZ = 4
+CORNERS = 15
+
+class SyntheticSession(Session):
+    """
+    A FastF1 session filled with generated data, for offline benchmarks and checks.
+    """
+    def __init__(self, event, sessionName, circuitInfo):
+        super().__init__(event, sessionName, f1_api_support=True)
+        self._circuitInfo = circuitInfo
+
+    def get_circuit_info(self):
+        return self._circuitInfo
+
+    def load(self, **kwargs):
+        pass
+
+def _makeEvent(year):
+    tz = 'Asia/Bahrain'
+    fields = {'RoundNumber': 1, 'Country': 'Synthetic', 'Location': 'Synthetic',
+              'OfficialEventName': 'Synthetic Grand Prix', 'EventDate': pd.Timestamp(f'{year}-03-02'),
+              'EventName': 'Synthetic Grand Prix', 'EventFormat': 'conventional', 'F1ApiSupport': True}
+    for i, name in enumerate(['Practice 1', 'Practice 2', 'Practice 3', 'Qualifying', 'Race'], 1):
+        local = pd.Timestamp(f'{year}-03-0{min(i, 2)} 18:00', tz=tz)
+        fields[f'Session{i}'] = name
+        fields[f'Session{i}Date'] = local
+        fields[f'Session{i}DateUtc'] = local.tz_convert('UTC').tz_localize(None)
+    return Event(fields, year=year)
+
+def _speedProfile(fraction, cornerFractions, cornerSpeeds):
+    #full speed on the straights, a smooth dip down to the apex speed around each corner
+    speed = np.full(fraction.shape, 320.0)
+    for f, v in zip(cornerFractions, cornerSpeeds):
+        d = np.abs(fraction - f)
+        dip = (320.0 - v) * np.exp(-(d / 0.012) ** 2)
+        speed = np.minimum(speed, 320.0 - dip)
+    return speed
+
+def makeSession(nDrivers=20, nLaps=57, year=2024, seed=0):
+    """
+    Generates a race-like session with realistic data sizes: car and position data at
+    4 Hz for every driver over nLaps laps of ~92s on a track with 15 corners.
+
+    :param nDrivers (int): number of cars (up to 99)
+    :param nLaps (int): laps driven by every car
+    :param seed (int): random seed, the same arguments always give the same session
+    """
+    rng = np.random.default_rng(seed)
+    corners = np.sort(rng.uniform(0.03, 0.97, CORNERS))
+    cornerSpeeds = rng.uniform(80, 250, CORNERS)
+    #lap length that matches the speed profile, so the corners sit where the cars slow down
+    lapLength = _speedProfile(np.linspace(0, 1, 10000), corners, cornerSpeeds).mean() / 3.6 * BASE_LAP_TIME
+    circuit = pd.DataFrame({
+        'X': 8000 * np.cos(2 * np.pi * corners), 'Y': 5000 * np.sin(2 * np.pi * corners),
+        'Number': np.arange(1, CORNERS + 1), 'Letter': '', 'Angle': 0.0, 'Distance': corners * lapLength,
+    })
+    circuitInfo = CircuitInfo(corners=circuit, marshal_lights=circuit.iloc[0:0], marshal_sectors=circuit.iloc[0:0],
+                              rotation=0.0)
+    session = SyntheticSession(_makeEvent(year), 'Race', circuitInfo)
+
+    t0 = pd.Timestamp(f'{year}-03-02 14:00:00')
+    session._t0_date = t0
+    session._session_info = {}
+    session._session_start_time = pd.Timedelta(0)
+    session._total_laps = nLaps
+    numbers = [str(n) for n in range(1, nDrivers + 1)]
+    codes = [f"D{n:02d}" for n in range(1, nDrivers + 1)]
+    session._results = SessionResults(pd.DataFrame({
+        'DriverNumber': numbers, 'Abbreviation': codes, 'FullName': codes,
+        'TeamName': [f"Team {i // 2}" for i in range(nDrivers)], 'TeamColor': 'FFFFFF',
+    }, index=numbers), _force_default_cols=True)
+
+    #one shared clock, like the real feeds where every car is sampled at the same time
+    clock = np.arange(0, 60 + nLaps * (BASE_LAP_TIME + 4) + nDrivers, 1.0 / CAR_DATA_HZ)
+    sessionTime = pd.to_timedelta(clock, unit='s')
+    rows = []
+    session._car_data = {}
+    session._pos_data = {}
+    for k, (number, code) in enumerate(zip(numbers, codes)):
+        lapTimes = BASE_LAP_TIME + 0.05 * k + rng.normal(0, 0.3, nLaps) + 0.02 * np.arange(nLaps)
+        bounds = 60.0 + 0.4 * k + np.concatenate(([0.0], np.cumsum(lapTimes)))
+        personalBest = lapTimes <= np.minimum.accumulate(lapTimes)
+        lap = np.clip(np.searchsorted(bounds, clock, side='right') - 1, 0, nLaps - 1)
+        fraction = np.clip((clock - bounds[lap]) / lapTimes[lap], 0, 1)
+        speed = _speedProfile(fraction, corners, cornerSpeeds + rng.normal(0, 2, CORNERS)) + rng.normal(0, 1, len(clock))
+        braking = np.gradient(speed) < -2
+        angle = 2 * np.pi * fraction
+        session._car_data[number] = Telemetry(pd.DataFrame({
+            'Date': t0 + sessionTime, 'RPM': 10500 + 20 * (speed - 200), 'Speed': speed,
+            'nGear': np.clip((speed / 40).astype(int), 1, 8), 'Throttle': np.where(braking, 0.0, np.clip(speed / 3, 0, 100)),
+            'Brake': braking, 'DRS': 0, 'Source': 'car', 'Time': sessionTime, 'SessionTime': sessionTime,
+        }), session=session, driver=number)
+        session._pos_data[number] = Telemetry(pd.DataFrame({
+            'Date': t0 + sessionTime, 'Status': 'OnTrack', 'X': 8000 * np.cos(angle), 'Y': 5000 * np.sin(angle),
+            'Z': 0.0, 'Source': 'pos', 'Time': sessionTime, 'SessionTime': sessionTime,
+        }), session=session, driver=number)
+        for i in range(nLaps):
+            rows.append({
+                'Time': pd.Timedelta(seconds=bounds[i + 1]), 'Driver': code, 'DriverNumber': number,
+                'LapTime': pd.Timedelta(seconds=lapTimes[i]), 'LapNumber': float(i + 1), 'Stint': 1.0 + (i >= nLaps // 2),
+                'PitOutTime': pd.NaT, 'PitInTime': pd.NaT, 'LapStartTime': pd.Timedelta(seconds=bounds[i]),
+                'Compound': 'MEDIUM' if i < nLaps // 2 else 'HARD', 'TyreLife': float(i % max(1, nLaps // 2) + 1),
+                'FreshTyre': True, 'Team': f"Team {k // 2}", 'TrackStatus': '1', 'Position': np.nan,
+                'Deleted': False, 'IsPersonalBest': bool(personalBest[i]), 'IsAccurate': True,
+            })
+    laps = pd.DataFrame(rows)
+    laps['LapStartDate'] = laps['LapStartTime'] + t0
+    session._laps = Laps(laps, session=session)
+    session._track_status = pd.DataFrame({'Time': [pd.Timedelta(0)], 'Status': ['1'], 'Message': ['AllClear']})
+    session._session_status = pd.DataFrame({'Time': [pd.Timedelta(0)], 'Status': ['Started']})
+    session._race_control_messages = pd.DataFrame({'Time': [t0], 'Category': ['Flag'], 'Message': ['GREEN']})
+    return session
@@ -1,30 +1,161 @@
-import fastf1
-import fastf1.plotting
 import os 
+import shutil
+import numpy as np
+import pandas as pd
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from profiler import currentRss, traced
+from laptrace import LapTrace
+#fastf1 (and the snapshot module built on it) is imported where it is used: importing this module
+#stays cheap and has no side effects, the dashboard and the CLI come up before FastF1 is even loaded
 
-cache_dir = 'cache'
-if not os.path.exists(cache_dir):
-    os.makedirs(cache_dir)
-fastf1.Cache.enable_cache(cache_dir)
-fastf1.plotting.setup_mpl()
+cache_dir = os.environ.get('F1_CACHE_DIR', 'cache')
+_cachePath = None
+_cacheLock = threading.Lock()
 
-def loadSession(year, grandPrix, sessionType = 'Q'):
+def initCache(path=None):
+    """
+    Creates the FastF1 cache directory and enables the cache.
+    The loaders call it before touching the API, call it first to use another directory.
+    Returns the directory in use.
+
+    :param path (str): cache directory, cache_dir (F1_CACHE_DIR or 'cache') by default
+    """
+    global _cachePath
+    with _cacheLock:
+        #already set up, a call without a path keeps whatever was chosen first
+        if _cachePath is not None and (path is None or path == _cachePath):
+            return _cachePath
+        import fastf1
+        path = path or cache_dir
+        os.makedirs(path, exist_ok=True)
+        fastf1.Cache.enable_cache(path)
+        _cachePath = path
+        return path
+
+@traced(details=('year', 'grandPrix', 'sessionType'))
+def loadSession(year, grandPrix, sessionType = 'Q', useSnapshot = True, drivers = None, channels = None):
     """
     Load a session and return the associated object
     
     :param year (int): the racing season (e.g, 2024)
     :param grandPrix (str): the GP name (e.g, 'Bahrain')
     :param sessionType (str): 'FP1', 'FP2', 'FP3', 'Q', 'S', 'R'
+    :param useSnapshot (bool): read/write the on-disk snapshot instead of parsing with FastF1 every time
+    :param drivers (list): only materialize telemetry for these drivers (e.g. ['VER', 'LEC']), all by default
+    :param channels (list): only keep these telemetry channels (e.g. ['Speed', 'X', 'Y']), all by default
     """
     print(f"Loading {year} {grandPrix} ({sessionType})...")
+    from snapshot import loadSnapshot, writeSnapshot, snapshotPath
+    if useSnapshot:
+        #a snapshot always holds every driver, so it also serves partial loads
+        try:
+            session = loadSnapshot(year, grandPrix, sessionType)
+        except Exception as e:
+            #truncated or corrupt: drop it so the load below writes a good one
+            path = snapshotPath(year, grandPrix, sessionType)
+            print(f"Could not read snapshot {path}, deleting it: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            session = None
+        if session is not None:
+            return session
     try:
+        import fastf1
+        initCache()
         session = fastf1.get_session(year, grandPrix, sessionType)
+        if drivers is not None:
+            #laps for everyone (they're cheap), telemetry only for who we look at
+            session.load(telemetry=False, weather=False)
+            session._partialChannels = channels
+            #the corner markers are placed on the session's fastest lap, so its driver is always needed
+            fastest = session.laps.pick_fastest()
+            if fastest is not None and not fastest.empty:
+                drivers = list(drivers) + [fastest['Driver']]
+            loadDriverTelemetry(session, drivers)
+            return session
         session.load()
+        if useSnapshot:
+            #a failed snapshot shouldn't fail the load, we just parse again next time
+            try:
+                writeSnapshot(session, year, grandPrix, sessionType)
+            except Exception as e:
+                print(f"Could not write snapshot: {e}")
         return session
     except Exception as e:
         print(f"Failed to load session: {e}")
         return None
+
+#bookkeeping columns FastF1 needs to slice and merge telemetry, kept whatever the channel selection
+_BASE_CHANNELS = ('Date', 'Time', 'SessionTime', 'Source', 'Speed')
+#only guards creating the per-session locks, the loads themselves run under their session's lock
+_telemetryLock = threading.Lock()
+
+def isPartialSession(session):
+    """
+    True if the session was loaded with a driver selection and may lack some drivers' telemetry.
+    """
+    return hasattr(session, '_partialChannels')
+
+def _sessionLock(session):
+    #one lock per session, kept on it, so loads of different sessions don't wait for each other
+    with _telemetryLock:
+        return session.__dict__.setdefault('_telemetryLock', threading.Lock())
+
+@traced(details=('drivers',))
+def loadDriverTelemetry(session, drivers):
+    """
+    Adds car and position data for some drivers to a partially loaded session.
+    Drivers that are already there are skipped, so the selection can grow lazily.
+
+    The result is the same as a full load for those drivers, except DriverAhead
+    which only knows about the loaded cars.
+    :param session (Session): a session loaded through loadSession(..., drivers=[...])
+    :param drivers (list): driver codes or numbers
+    """
+    with _sessionLock(session):
+        if not hasattr(session, '_car_data'):
+            session._car_data = {}
+            session._pos_data = {}
+        results = session.results
+        missing = []
+        for driver in drivers:
+            match = results[(results['Abbreviation'] == driver) | (results['DriverNumber'] == driver)]
+            if not match.empty and match['DriverNumber'].iloc[0] not in session._car_data:
+                missing.append(match['DriverNumber'].iloc[0])
+        if not missing:
+            return session
+
+        #the live timing streams carry every car, FastF1 caches them parsed so this is mostly unpickling
+        from fastf1 import _api as api
+        from fastf1.core import Telemetry
+        initCache()
+        print(f"Loading telemetry for {', '.join(missing)}...")
+        carData = api.car_data(session.api_path)
+        posData = api.position_data(session.api_path)
+        if getattr(session, '_t0_date', None) is None:
+            #t0 is computed from every car like a full load does, otherwise all timestamps would shift
+            session._calculate_t0_date(carData, posData)
+            session._laps['LapStartDate'] = session._laps['LapStartTime'] + session.t0_date
+
+        channels = session._partialChannels
+        for src, processed in ((carData, session._car_data), (posData, session._pos_data)):
+            for drv in missing:
+                if drv not in src:
+                    continue
+                raw = src[drv].drop(labels='Time', axis=1)
+                if channels is not None:
+                    raw = raw[[c for c in raw.columns if c in _BASE_CHANNELS or c in channels]]
+                #same processing as Session._load_telemetry
+                tel = Telemetry(raw, session=session, driver=drv,
+                                drop_unknown_channels=True, _cast_default_cols=True)
+                tel['Date'] = tel['Date'].dt.round('ms')
+                tel['Time'] = tel['Date'] - session.t0_date
+                tel['SessionTime'] = tel['Time']
+                processed[drv] = tel
+    return session
     
+@traced(details=('driverCode',))
 def getFastestLap(session, driverCode):
     """
     Get the fastest lap for a specific driver
@@ -37,6 +168,9 @@ def getFastestLap(session, driverCode):
         if len(laps) == 0:
             print(f"Driver '{driverCode}' didn't participate.")
             return None, None
+        #a partial session may not have this driver's telemetry yet
+        if isPartialSession(session):
+            loadDriverTelemetry(session, [driverCode])
         #if all good, we get his fastest lap and the related telemetry data
         fastestLap = laps.pick_fastest()
         telemetryData = fastestLap.get_telemetry()
@@ -45,18 +179,287 @@ def getFastestLap(session, driverCode):
         print(f"Error extracting lap for {driverCode}: {e}")
         return None, None
     
+_traceLock = threading.Lock()
+
+def getFastestTrace(session, driverCode):
+    """
+    Same as getFastestLap but returns the telemetry as a LapTrace, computed once per session and driver.
+    A call made while another thread (e.g. the prefetcher) is extracting the same lap waits for it.
+    """
+    with _traceLock:
+        #kept on the session so it goes away when the pool drops the session
+        traces = session.__dict__.setdefault('_fastestTraces', {})
+        future = traces.get(driverCode)
+        owner = future is None
+        if owner:
+            future = traces[driverCode] = Future()
+    if not owner:
+        return future.result()
+    try:
+        lap, tel = getFastestLap(session, driverCode)
+        result = (lap, LapTrace.fromLap(lap, tel)) if tel is not None else (None, None)
+    except Exception as e:
+        with _traceLock:
+            del traces[driverCode]
+        future.set_exception(e)
+        raise
+    if tel is None:
+        #not cached, the next call tries again
+        with _traceLock:
+            del traces[driverCode]
+    future.set_result(result)
+    return result
+
+#channels extracted for every lap by default, car data then position data
+LAP_CHANNELS = ['Speed', 'RPM', 'nGear', 'Throttle', 'Brake', 'DRS', 'X', 'Y', 'Z']
+_POS_CHANNELS = ('X', 'Y', 'Z')
+
+@traced(details=('drivers',))
+def stackLaps(session, drivers=None, channels=None):
+    """
+    Puts the telemetry of every lap of every driver into flat numpy arrays, sorted by driver, lap then time.
+    Each driver's car data is sliced once with searchsorted on the lap start/end times instead of
+    merging it lap by lap like Lap.get_telemetry, and the distance from the start of each lap is
+    integrated for all laps at once.
+    Samples are the car data samples, position channels are interpolated at their times.
+    Returns a dict of arrays ('Driver', 'LapNumber', 'LapId', 'SessionTime', 'Time', 'Distance' and the channels),
+    or None if there is no telemetry.
+
+    :param session (Session): a session loaded with laps and telemetry
+    :param drivers (list): driver codes, every driver by default
+    :param channels (list): telemetry channels to extract, LAP_CHANNELS by default
+    """
+    laps = session.laps
+    if drivers is not None:
+        laps = laps.pick_drivers(drivers)
+    laps = laps[laps['LapStartTime'].notna() & laps['Time'].notna()]
+    if isPartialSession(session):
+        loadDriverTelemetry(session, laps['Driver'].dropna().unique().tolist())
+    channels = LAP_CHANNELS if channels is None else channels
+
+    columns = {k: [] for k in ['Driver', 'LapNumber', 'LapId', 'SessionTime', 'Time', 'Distance', *channels]}
+    lapOffset = 0
+    #grouped by code so the (Driver, LapNumber) index comes out sorted
+    for driver, driverLaps in laps.groupby('Driver'):
+        driverNumber = driverLaps['DriverNumber'].iloc[0]
+        if driverNumber not in session.car_data:
+            continue
+        driverLaps = driverLaps.sort_values('LapStartTime')
+        car = session.car_data[driverNumber]
+        t = car['SessionTime'].dt.total_seconds().to_numpy()
+        lapStart = driverLaps['LapStartTime'].dt.total_seconds().to_numpy()
+        lapEnd = driverLaps['Time'].dt.total_seconds().to_numpy()
+
+        #which lap each sample belongs to, samples between laps (garage, gaps) are dropped
+        lap = np.searchsorted(lapStart, t, side='right') - 1
+        keep = (lap >= 0) & (t < lapEnd[np.clip(lap, 0, None)])
+        if not keep.any():
+            #car data but none of it inside a timed lap
+            continue
+        lap = lap[keep]
+        t = t[keep]
+        speed = car['Speed'].to_numpy(dtype=np.float64)[keep]
+
+        #distance from the start of each lap, integrated like Telemetry.add_distance
+        dt = np.diff(t, prepend=t[:1])
+        newLap = np.r_[True, lap[1:] != lap[:-1]]
+        dt[newLap] = t[newLap] - lapStart[lap[newLap]]
+        ds = speed / 3.6 * dt
+        cum = np.cumsum(ds)
+        firstIdx = np.flatnonzero(newLap)
+        lapBase = (cum[firstIdx] - ds[firstIdx])[np.cumsum(newLap) - 1]
+
+        columns['Driver'].append(np.full(len(t), driver, dtype=object))
+        columns['LapNumber'].append(driverLaps['LapNumber'].to_numpy()[lap])
+        columns['LapId'].append(lap + lapOffset)
+        columns['SessionTime'].append(t)
+        columns['Time'].append(t - lapStart[lap])
+        columns['Distance'].append(cum - lapBase)
+        pos = (getattr(session, '_pos_data', None) or {}).get(driverNumber)
+        if pos is not None:
+            posTime = pos['SessionTime'].dt.total_seconds().to_numpy()
+        for c in channels:
+            if c in _POS_CHANNELS and pos is not None and c in pos:
+                values = np.interp(t, posTime, pos[c].to_numpy(dtype=np.float64))
+            elif c in car:
+                values = car[c].to_numpy()[keep]
+            else:
+                values = np.full(len(t), np.nan)
+            columns[c].append(values)
+        lapOffset += len(driverLaps)
+    if not columns['LapId']:
+        return None
+    return {k: np.concatenate(v) for k, v in columns.items()}
+
+def getAllLaps(session, drivers=None, channels=None):
+    """
+    Telemetry of every lap of a driver or of the whole field in one dataframe indexed by (Driver, LapNumber),
+    with Time from the start of the lap, SessionTime, Distance from the start of the lap and the channels.
+    Returns None if there is no telemetry.
+
+    :param session (Session): a session loaded with laps and telemetry
+    :param drivers (list): driver codes, every driver by default
+    :param channels (list): telemetry channels to extract, LAP_CHANNELS by default
+    """
+    print(f"Extracting all laps for {', '.join(drivers) if drivers else 'every driver'}...")
+    data = stackLaps(session, drivers, channels)
+    if data is None:
+        return None
+    index = pd.MultiIndex.from_arrays([data.pop('Driver'), data.pop('LapNumber')], names=['Driver', 'LapNumber'])
+    del data['LapId']
+    data['SessionTime'] = pd.to_timedelta(data['SessionTime'], unit='s')
+    data['Time'] = pd.to_timedelta(data['Time'], unit='s')
+    return pd.DataFrame(data, index=index)
+
+@traced(details=('year', 'grandPrix', 'sessionType'))
 def loadSessionLight(year, grandPrix, sessionType):
     """
     Loads a session without telemetry/laps data to quickly get the driver list.
     """
     print(f"⬇Loading Driver List: {year} {grandPrix} ({sessionType})...")
     try:
+        import fastf1
+        initCache()
         session = fastf1.get_session(year, grandPrix, sessionType)
         session.load(telemetry=False, laps=False, weather=False)
         return session
     except Exception as e:
         print(f"Failed to load session header: {e}")
         return None
+
+def estimateSessionBytes(session):
+    """
+    Rough memory footprint of a loaded session (laps, results and telemetry tables).
+    """
+    total = 0
+    #we read the private attributes so a partially loaded session doesn't raise
+    for attr in ('_laps', '_results', '_weather_data', '_race_control_messages'):
+        df = getattr(session, attr, None)
+        if df is not None:
+            total += int(df.memory_usage(index=True, deep=False).sum())
+    for attr in ('_car_data', '_pos_data'):
+        for tel in (getattr(session, attr, None) or {}).values():
+            total += int(tel.memory_usage(index=True, deep=False).sum())
+    return total
+
+class SessionPool:
+    """
+    Process-wide pool of loaded sessions shared by every Streamlit user.
+    Concurrent requests for the same session wait on a single load, and the least
+    recently used sessions are dropped once the memory budget is exceeded.
+
+    :param maxBytes (int): budget for the estimated size of the pooled sessions
+    :param maxRss (int): optional budget for the resident memory of the whole process
+    """
+    def __init__(self, maxBytes=4 * 1024**3, maxRss=None):
+        self.maxBytes = maxBytes
+        self.maxRss = maxRss
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict() #key -> (session, bytes), oldest first
+        self._loading = {} #key -> threading.Event of the in-flight load
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def get(self, key, loader):
+        """
+        Returns the pooled session for key, calling loader() once if it isn't loaded yet.
+        Failed loads (loader returning None) are not pooled.
+        """
+        while True:
+            with self._lock:
+                if key in self._sessions:
+                    self._sessions.move_to_end(key)
+                    self.hits += 1
+                    return self._sessions[key][0]
+                inFlight = self._loading.get(key)
+                if inFlight is None:
+                    inFlight = threading.Event()
+                    self._loading[key] = inFlight
+                    self.misses += 1
+                    break
+                self.waits += 1
+            #someone else is loading it, we wait and look again
+            inFlight.wait()
+            with self._lock:
+                if key in self._sessions:
+                    self._sessions.move_to_end(key)
+                    return self._sessions[key][0]
+                if key not in self._loading:
+                    #the load we waited on failed, no point hammering the api again
+                    return None
+
+        session = None
+        try:
+            session = loader()
+        finally:
+            with self._lock:
+                if session is not None:
+                    self._sessions[key] = (session, estimateSessionBytes(session))
+                    self._evict()
+                del self._loading[key]
+            inFlight.set()
+        return session
+
+    def _evict(self):
+        #always keep the most recent session, even if it alone is over budget
+        while len(self._sessions) > 1 and self._overBudget():
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def _overBudget(self):
+        if self.maxBytes is not None and sum(b for _, b in self._sessions.values()) > self.maxBytes:
+            return True
+        if self.maxRss is not None:
+            rss = currentRss()
+            return rss is not None and rss > self.maxRss
+        return False
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self):
+        """
+        Returns the pool counters and current size.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'evictions': self.evictions,
+                'sessions': len(self._sessions),
+                'bytes': sum(b for _, b in self._sessions.values()),
+                'loading': len(self._loading),
+            }
+
+#the budgets can be tuned per server without touching the code
+sessionPool = SessionPool(
+    maxBytes=int(os.environ.get('F1_POOL_MAX_BYTES', 4 * 1024**3)),
+    maxRss=int(os.environ['F1_POOL_MAX_RSS']) if os.environ.get('F1_POOL_MAX_RSS') else None,
+)
+
+@traced(details=('light',))
+def getPooledSession(year, grandPrix, sessionType = 'Q', light = False, drivers = None, channels = None):
+    """
+    Same as loadSession (or loadSessionLight) but goes through the shared session pool.
+    With drivers, the pooled partial session grows to cover every driver asked for so far.
+    """
+    if light:
+        return sessionPool.get(('light', year, grandPrix, sessionType),
+                               lambda: loadSessionLight(year, grandPrix, sessionType))
+    if drivers is not None:
+        channelsKey = tuple(channels) if channels is not None else None
+        session = sessionPool.get(('partial', year, grandPrix, sessionType, channelsKey),
+                                  lambda: loadSession(year, grandPrix, sessionType,
+                                                      drivers=drivers, channels=channels))
+        if session is not None and isPartialSession(session):
+            loadDriverTelemetry(session, drivers)
+        return session
+    return sessionPool.get(('full', year, grandPrix, sessionType),
+                           lambda: loadSession(year, grandPrix, sessionType))
     
 if __name__ == "__main__":
     session = loadSession(2024, 'Bahrain')
@@ -1,10 +1,15 @@
-import plotly.graph_objects as go
 import numpy as np
+from analysis import computeMinisectors
+from profiler import traced
+from laptrace import channel
+#plotly is imported where a map is drawn, not when the module is loaded
 
+@traced(details=('driver',))
 def plotTrackMap(session, driver, tel):
     """
     Plots the track map with speed heatmap for a specific driver.
     """
+    import plotly.graph_objects as go
     eventName = f"{session.event.EventName} {session.event.year}"
     #create the scatter plot
     #to enable the colors gradient for the heatmap, we'll use markers instead of lines
@@ -48,4 +53,53 @@ def plotTrackMap(session, driver, tel):
         height=600,
         margin=dict(l=0, r=0, t=50, b=0)
     )
-    return fig
\ No newline at end of file
+    return fig
+
+@traced()
+def plotDominanceMap(session, drivers, telemetries, colors, nSectors=50):
+    """
+    Plots the track coloured by the fastest driver in each minisector.
+    Consecutive minisectors won by the same driver are drawn as one line.
+
+    :param drivers (list): driver codes, in the same order as telemetries
+    :param telemetries (list): the drivers' telemetry dataframes or LapTraces
+    :param colors (dict): driver code -> colour
+    :param nSectors (int): number of minisectors
+    """
+    import plotly.graph_objects as go
+    eventName = f"{session.event.EventName} {session.event.year}"
+    boundaries, sectorTimes, fastest = computeMinisectors(telemetries, nSectors)
+    #the first driver's line is the track outline
+    tel = telemetries[0]
+    x = channel(tel, 'X')
+    y = channel(tel, 'Y')
+    sampleSector = np.clip(np.searchsorted(boundaries, channel(tel, 'Distance'), side='right') - 1, 0, nSectors - 1)
+
+    #runs of minisectors with the same winner
+    runStarts = np.concatenate(([0], np.flatnonzero(np.diff(fastest)) + 1))
+    runEnds = np.append(runStarts[1:], nSectors)
+    #first and last sample of each run, plus one so the lines join up
+    sampleStarts = np.searchsorted(sampleSector, runStarts, side='left')
+    sampleEnds = np.minimum(np.searchsorted(sampleSector, runEnds, side='left') + 1, len(x))
+
+    fig = go.Figure()
+    shown = set()
+    for runStart, runEnd, i0, i1 in zip(runStarts, runEnds, sampleStarts, sampleEnds):
+        driver = drivers[fastest[runStart]]
+        fig.add_trace(go.Scatter(
+            x=x[i0:i1], y=y[i0:i1],
+            mode='lines',
+            line=dict(color=colors[driver], width=6),
+            name=driver, legendgroup=driver, showlegend=driver not in shown,
+            hovertemplate=f"{driver} fastest<br>Minisectors {runStart + 1}-{runEnd}<extra></extra>"
+        ))
+        shown.add(driver)
+    fig.update_layout(
+        template="plotly_dark",
+        title=dict(text=f"{eventName} - Minisector Dominance", font=dict(size=20)),
+        xaxis=dict(showgrid=False, visible=False),
+        yaxis=dict(showgrid=False, visible=False, scaleanchor="x", scaleratio=1),
+        height=600,
+        margin=dict(l=0, r=0, t=50, b=0)
+    )
+    return fig